@@ -15,12 +15,20 @@ data = NDData("nd_data.csv")
 data.set({"col1": "val1", "col2": "val2"}, {"i1": "ind1", "i2": "ind2"})
 data.set({"col1": 1, "col2": 2}, {"i1": 3, "i2": 4})
 
+# We create several rows at once (the file is written only once)
+data.set_many([
+    ({"col1": 5, "col2": 6}, {"i1": 7, "i2": 8}),
+    ({"col1": 9, "col2": 10}, {"i1": 11, "i2": 12})])
+
 # We print the pandas dataframe
 print(data)
 
 # We get the column "col1" when "i1=3"
 print(data.get("col1", i1=3))
 
+# We get the column "col1" when "i1" is (as a number) larger than 5
+print(data.get("col1", i1__gt=5))
+
 # We print the keys in the indices
 print(data.index_keys())
 
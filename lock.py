@@ -36,6 +36,15 @@ class Lock():
                 # If we couldn't get the lock, we wait (a bit)
                 time.sleep(0.1)
 
+    def _version(self):
+        # We get a token that changes when the file is modified
+        # (i.e., the inode, the size and the modification time)
+        try:
+            stat = os.stat(self._path_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
     def _get_lock(self):
 
         # We create the file if it does not exist
@@ -3,7 +3,9 @@
 # terms of the Do What The Fuck You Want To Public License, Version 2,
 # as published by Sam Hocevar. See http://www.wtfpl.net/ for more details.
 
-import re
+import os
+import json
+import sqlite3
 import numpy as np
 import pandas as pd
 
@@ -12,31 +14,339 @@ from lock import Lock
 ###############################################################################
 
 
-class NDData(Lock):
-
-    def _load(self):
+class CSVStorage():
 
+    def read(self, file_, column_list=None):
+        # NOTE: we cannot read only some columns in a csv file, so we read
+        # all of them
         try:
-            # We try to read the csv file (in the lock file)
-            self.data = pd.read_csv(
-                self._lock_file,
-                index_col=0)
+            # We try to read the csv file
+            return pd.read_csv(file_, index_col=0)
         except pd.errors.EmptyDataError:
             # If the file is empty, we create a new data frame
-            self.data = pd.DataFrame()
-        except FileNotFoundError:
-            # If we do not found the lock file, we keep lock flag to False
-            self.got_lock = False
+            return pd.DataFrame()
 
-        # We initialize the data
-        self._init_hidden_data()
-        self._init_index()
+    def read_chunk(self, file_, chunksize, column_list=None):
+        try:
+            # We read only the index and the columns that we need (with
+            # their positions in the header of the csv file)
+            usecols = None
+            if(column_list is not None):
+                header = pd.read_csv(file_, index_col=0, nrows=0).columns
+                column_set = set(column_list)
+                usecols = [0]+[
+                    i+1 for i, col in enumerate(header) if col in column_set]
+            # We read the csv file by chunks of "chunksize" rows
+            reader = pd.read_csv(
+                file_, index_col=0, usecols=usecols, chunksize=chunksize)
+        except pd.errors.EmptyDataError:
+            # If the file is empty, there is no chunk
+            return
+        with reader:
+            yield from reader
+
+    def write(self, data, file_):
+        # We save the data in the csv file
+        data.to_csv(file_)
+
+
+class ParquetStorage():
+
+    def read(self, file_, column_list=None):
+        # If the file is empty, we create a new data frame
+        if(os.path.getsize(file_) == 0):
+            return pd.DataFrame()
+
+        # We read only the columns (in the file) that we need
+        if(column_list is not None):
+            column_set = set(self._column_list(file_))
+            column_list = [col for col in column_list if col in column_set]
+        return self._read(file_, column_list)
+
+    def read_chunk(self, file_, chunksize, column_list=None):
+        # NOTE: We read the file at once (i.e., in one chunk)
+        yield self.read(file_, column_list)
+
+    def write(self, data, file_):
+        # The columns with different types (e.g., str and float) cannot be
+        # saved, so we save their values as str (as in a csv file)
+        data = data.copy()
+        for col in data.columns:
+            if(data[col].dtype == object):
+                data[col] = data[col].map(
+                    lambda val: val if pd.isna(val) else str(val))
+        self._write(data, file_)
+
+    def _column_list(self, file_):
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(file_).names
+
+    def _read(self, file_, column_list):
+        return pd.read_parquet(file_, columns=column_list)
+
+    def _write(self, data, file_):
+        data.to_parquet(file_)
+
+
+class FeatherStorage(ParquetStorage):
+
+    # NOTE: A feather file cannot save the index, so we save it in a column
+    INDEX = "__index__"
+
+    def _column_list(self, file_):
+        import pyarrow.ipc
+        with pyarrow.ipc.open_file(file_) as f:
+            return f.schema.names
+
+    def _read(self, file_, column_list):
+        if(column_list is not None):
+            column_list = [self.INDEX]+column_list
+        data = pd.read_feather(file_, columns=column_list)
+        data = data.set_index(self.INDEX)
+        data.index.name = None
+        return data
+
+    def _write(self, data, file_):
+        data.reset_index(names=self.INDEX).to_feather(file_)
+
+
+###############################################################################
+
+
+class NDData(Lock):
+
+    def __init__(
+        self, file_, journal=False, journal_size=None, storage=None,
+        chunksize=None
+    ):
+        super().__init__(file_)
+
+        # NOTE: The storage is either "csv", "parquet", "feather" (or an
+        # object with the functions "read" and "write"); by default, we
+        # use the extension of the file and csv otherwise.
+        if(storage is None):
+            storage = os.path.splitext(self._path_file)[1][1:].lower()
+            storage = {"parquet": "parquet", "pq": "parquet",
+                       "feather": "feather", "arrow": "feather"
+                       }.get(storage, "csv")
+        if(storage == "csv"):
+            storage = CSVStorage()
+        elif(storage == "parquet"):
+            storage = ParquetStorage()
+        elif(storage == "feather"):
+            storage = FeatherStorage()
+        elif(isinstance(storage, str)):
+            raise ValueError(
+                "storage must be either csv, parquet, or feather")
+        self.storage = storage
+
+        # NOTE: If journal is True, "set" appends the records in a journal
+        # (next to the file) instead of rewriting the file; the journal is
+        # merged with the file when we read it and compacted (i.e., written
+        # in the file) when we call "compact" or when its size (in bytes)
+        # is larger than journal_size.
+        self._journal_file = self._path_file+".journal"
+        self.journal = journal
+        self.journal_size = journal_size
+
+        # NOTE: If chunksize is not None, "get" and "aggregate" read the
+        # file by chunks of "chunksize" rows and keep only the selected rows
+        # (instead of loading the whole file); the data cannot be modified.
+        self.chunksize = chunksize
+
+        # We keep the version of the file that we have loaded (and the part
+        # of the journal that we have loaded)
+        self.__version = None
+        self.__column_list = None
+        self.__journal_version = (None, 0)
+
+    def _load(self, column_list=None):
+
+        # NOTE: If column_list is not None, we only need these columns (and
+        # we can read only them if there is no journal)
+        if(column_list is not None and os.path.exists(self._journal_file)):
+            column_list = None
+
+        # NOTE: The file is replaced atomically (see _save), so we can read
+        # it without the lock; if the file is replaced while we read it (or
+        # its journal), we read it again
+        while(True):
+
+            # If the file has not been modified since the last load (and if
+            # we have loaded the columns), we keep the data (and the index)
+            # that we have in memory, and we only load the new records of the
+            # journal
+            version = self._version()
+            if(version is not None and version == self.__version
+               and (self.__column_list is None
+                    or (column_list is not None
+                        and set(column_list) <= set(self.__column_list)))):
+                self.__load_journal()
+            else:
+                try:
+                    # We try to read the file
+                    self.data = self.storage.read(
+                        self._path_file, column_list)
+                except FileNotFoundError:
+                    # If the file does not exist (yet), there is no data
+                    self.data = pd.DataFrame()
+
+                # We initialize the data
+                self._init_hidden_data()
+                self._init_index()
+                self.__version = version
+                self.__column_list = column_list
+
+                # We load the records of the journal
+                self.__journal_version = (None, 0)
+                self.__load_journal()
+
+            # If the file is the one that we read, we have a snapshot
+            if(self._version() == version):
+                return
+            self.__version = None
 
     def _save(self):
-        # We save the (new) data in the lock file
-        self.data.to_csv(self._lock_file)
+        # We save the (new) data in a temporary file, and we replace the file
+        # (atomically) so that the readers always see a whole file
+        tmp_file = f"{self._path_file}.{os.getpid()}.tmp"
+        self.storage.write(self.data, tmp_file)
+        os.replace(tmp_file, self._path_file)
+        # The records of the journal are now in the file
+        try:
+            os.remove(self._journal_file)
+        except FileNotFoundError:
+            pass
+        # The data in memory are not the ones in the file anymore
+        # (e.g., the types), so we will load the file again
+        self.__version = None
         return True
 
+    # ----------------------------------------------------------------------- #
+    # Journal
+
+    def __load_journal(self):
+
+        # We read the records of the journal that we have not loaded
+        try:
+            with open(self._journal_file, "rb") as f:
+                journal_inode = os.fstat(f.fileno()).st_ino
+                offset = self.__journal_version[1]
+                if(journal_inode != self.__journal_version[0]):
+                    offset = 0
+                f.seek(offset)
+                line_list = f.read().split(b"\n")
+        except FileNotFoundError:
+            # If the journal does not exist, there is nothing to load (but
+            # if we loaded a journal that was removed, we load the file again)
+            if(self.__journal_version[1] > 0):
+                self.__version = None
+                self._load()
+            return
+
+        # If the journal is a new one while we loaded the old one, we need
+        # to load the file again
+        if(offset == 0 and self.__journal_version[1] > 0):
+            self.__version = None
+            self._load()
+            return
+
+        # We remove the last line (that is empty or not written yet)
+        line_list = line_list[:-1]
+        if(len(line_list) == 0):
+            return
+        new_offset = offset
+        for line in line_list:
+            new_offset += len(line)+1
+        line_list = [json.loads(line) for line in line_list]
+
+        # The first line of the journal is the version of the file on which
+        # the records are applied; if we did not load this file, the records
+        # are already in the file (e.g., the journal was not removed after
+        # the compaction), so we do not apply them
+        if(offset == 0 and "base" in line_list[0]):
+            if(self.__version is None
+               or tuple(line_list[0]["base"]) != self.__version):
+                return
+            line_list = line_list[1:]
+        self.__journal_version = (journal_inode, new_offset)
+
+        # We apply the records (with the same "erase" at once) and we
+        # initialize the data (with the new rows); if we raise an error, the
+        # data in memory are not valid, so we will load the file again
+        record_list = []
+        try:
+            for i, line in enumerate(line_list):
+                record_list += [
+                    tuple(record) for record in line["record_list"]]
+                erase = line["erase"]
+                if(i == len(line_list)-1 or line_list[i+1]["erase"] != erase):
+                    self.__set_record(record_list, erase=erase)
+                    self._init_hidden_data()
+                    self._init_index()
+                    record_list = []
+        except BaseException:
+            self.__version = None
+            raise
+
+    def __save_journal(self, record_list, erase=False):
+
+        # If the journal was created for another version of the file, its
+        # records are already in the file, so we remove it
+        version = self._version()
+        base = self.__journal_base()
+        if(base is not None and base != version):
+            os.remove(self._journal_file)
+
+        # We append the records in the journal (in one line); a new journal
+        # starts with the version of the file
+        line = json.dumps(
+            {"record_list": [list(record) for record in record_list],
+             "erase": erase},
+            default=self.__to_json)
+        with open(self._journal_file, "a") as f:
+            if(f.tell() == 0):
+                f.write(json.dumps({"base": list(version)})+"\n")
+            f.write(line+"\n")
+
+        # We compact the journal if it is too large
+        if(self.journal_size is not None
+           and os.path.getsize(self._journal_file) >= self.journal_size):
+            self.__compact()
+
+    def __journal_base(self):
+        # We get the version of the file in the first line of the journal
+        # (if there is one)
+        try:
+            with open(self._journal_file, "rb") as f:
+                line = f.readline()
+        except FileNotFoundError:
+            return None
+        if(not(line.endswith(b"\n"))):
+            return None
+        line = json.loads(line)
+        if("base" not in line):
+            return None
+        return tuple(line["base"])
+
+    def __to_json(self, value):
+        # We convert the numpy values (to save them in the journal)
+        if(isinstance(value, np.generic)):
+            return value.item()
+        raise TypeError(
+            f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def compact(self):
+        return self.do(self.__compact)
+
+    def __compact(self):
+        # If there is no journal, there is nothing to compact
+        if(not(os.path.exists(self._journal_file))):
+            return
+        # We load the data (with the journal) and we save it in the file
+        self._load()
+        self._save()
+
     # ----------------------------------------------------------------------- #
     # Data
 
@@ -44,93 +354,215 @@ class NDData(Lock):
         # We first copy the data
         self._hidden_data = self.data.copy(deep=True)
 
-        # For each index,
-        for i, index_ in enumerate(list(self.data.index)):
-
-            # We get all the key and values associated with an index
-            index = self.__interpret_index(index_)
-
-            # For each key, we will add a new column in the data
-            for col, val in index:
-                # If the column does not exist, we create it
-                if(col not in self._hidden_data):
-                    self._hidden_data[col] = np.nan
-                # We add the value (associated with the key) to the data
-                self._hidden_data.loc[index_, col] = val
+        # We get all the keys and values associated with the indices
+        # (i.e., the position of the row, the key and the value)
+        self._index_frame = self.__interpret_index_list(self.data.index)
+        index_frame = self._index_frame.drop_duplicates(
+            ["row", "key"], keep="last")
+
+        # We create a column for each key (with the values of the rows);
+        # the values are typed (i.e., numbers or categories)
+        key_list = list(pd.unique(index_frame["key"]))
+        key_data = index_frame.pivot(index="row", columns="key", values="val")
+        key_data = key_data.reindex(
+            index=range(len(self.data)), columns=key_list)
+        self._key_data = pd.DataFrame(
+            {key: self._type_key(key_data[key]) for key in key_list},
+            index=range(len(self.data)))
+
+        # For each key that is already a column, we replace the values
+        for key in key_list:
+            if(key in self._hidden_data):
+                val = self._key_data[key].to_numpy(dtype=object)
+                self._hidden_data[key] = np.where(
+                    pd.isna(val),
+                    self._hidden_data[key].to_numpy(dtype=object), val)
+
+        # We add the other keys in the data (all at once)
+        key_list = [key for key in key_list if key not in self._hidden_data]
+        if(len(key_list) > 0):
+            key_data = self._key_data[key_list].set_axis(
+                self._hidden_data.index)
+            self._hidden_data = pd.concat(
+                [self._hidden_data, key_data], axis=1)
 
     def _init_index(self):
 
-        # We create a dictionary where we store the values
+        # We create a dictionary where we store the values: for each key and
+        # (typed) value, we have the (sorted) array of the rows (the integers
+        # are int and the rows without the key have the value None)
         self.index_dict = {}
-
-        # For each index,
-        for i, index_ in enumerate(list(self._hidden_data.index)):
-
-            # We get all the key and values associated with an index
-            index = self.__interpret_index(index_)
-
-            # For each key/value
-            for key, val in index:
-
-                # If the key is not in the dictionay
-                if(key not in self.index_dict):
-                    # We add the value and the key in the dictionay
-                    self.index_dict[key] = {val: [i]}
-                # If the value is not in the dictionary, we add it
-                elif(val not in self.index_dict[key]):
-                    self.index_dict[key][val] = [i]
-                # Otherwise, we add the value to the list
+        for key in self._key_data.columns:
+            self.index_dict[key] = {}
+            row_dict = self._key_data.groupby(
+                key, observed=True, sort=False).indices
+            for val, row in row_dict.items():
+                if(isinstance(val, np.generic)):
+                    val = val.item()
+                if(isinstance(val, float) and val.is_integer()):
+                    val = int(val)
+                self.index_dict[key][val] = row
+            row = np.flatnonzero(self._key_data[key].isna().to_numpy())
+            if(len(row) > 0):
+                self.index_dict[key][None] = row
+
+    def _type_key(self, val):
+        # We get the values of a key (the value None is a missing value)
+        val = pd.Series(val, dtype=object)
+        val = val.where(val != "None")
+
+        # If all the values are numbers, the key is numeric; otherwise, the
+        # values are categories (written as in the index)
+        num = pd.to_numeric(val, errors="coerce")
+        if((num.isna() == val.isna()).all()):
+            return num
+        return val.astype("category")
+
+    def __interpret_index_list(self, index_list):
+
+        # We split all the indices to get the "key=val" (with the position
+        # of the row associated with each "key=val")
+        key_val = pd.Series(list(index_list), dtype=object)
+        key_val = key_val.str.split("/").explode()
+        row = key_val.index.to_numpy(dtype=np.int64)
+
+        # For each value, we split it again to obtain the "key" and "val"
+        # from "key=val"
+        key_val = key_val.str.split("[=,]", regex=True)
+
+        # If we do not have "key=val" everywhere, we raise an error
+        if((key_val.str.len() != 2).any()):
+            raise RuntimeError("We must have the key=val in the index")
+
+        # We get the "key" (we replace "-" by "_") and the "val"
+        key = key_val.str[0].str.replace("-", "_", regex=False)
+        val = key_val.str[1]
+
+        # We return the rows, the "key" and the "val"
+        return pd.DataFrame({
+            "row": row, "key": key.to_numpy(), "val": val.to_numpy()})
+
+    def _interpret_query(self, key, key_list):
+        # NOTE: We can select the values of a key with "key=val" (or a list
+        # of values), and with a comparison: "key__ne" (not in the values),
+        # "key__lt", "key__le", "key__gt", "key__ge" (for numbers)
+        if(key not in key_list and "__" in key):
+            key_, op = key.rsplit("__", 1)
+            if(op in ["ne", "lt", "le", "gt", "ge"]):
+                return key_, op
+        return key, "eq"
+
+    def _select(self, key_data, val_dict, op, val):
+        # We get the mask of the rows where the (typed) value of the key is
+        # equal to (one of) the value(s), or satisfies the comparison
+        if(op == "eq" or op == "ne"):
+            if(not(isinstance(val, list))):
+                val = [val]
+            row_mask = np.zeros(len(key_data), dtype=bool)
+            for val_ in val:
+                # The value None selects the rows without the key
+                if(val_ is None or (isinstance(val_, str) and val_ == "None")):
+                    row_mask |= key_data.isna().to_numpy()
+                    continue
+                # We get the rows with the value (as a number if the key is
+                # numeric, and as a str otherwise)
+                if(isinstance(key_data.dtype, pd.CategoricalDtype)):
+                    val_ = self._index_value(val_)
                 else:
-                    self.index_dict[key][val].append(i)
-
-    def __rename_dash(self, var):
-        # For a given variable, we replace "-" by "_" (for the indices)
-        var = var.replace("-", "_")
-        return var
-
-    def __interpret_index(self, index):
-
-        key_val_dict = []
-
-        # For split the index to get all the values
-        for key_val in index.split("/"):
-            # For each value, we split it again to obtain the "key" and "val"
-            # from "key=val"
-            key_val = re.split("[=,]", key_val)
-
-            # If we have "key=val"
-            if(len(key_val) == 2):
-                # We get the "key"
-                key = key_val[0]
-                key = self.__rename_dash(key)
-                # We get the "val"
-                val = key_val[1]
-                # and we save in the dictionary
-                key_val_dict.append((key, val))
-            else:
-                # Otherwise, we raise an error
-                raise RuntimeError("We must have the key=val in the index")
-
-        # We return the dictionary
-        return tuple(key_val_dict)
-
-    def __create_index(self, index_dict):
+                    try:
+                        val_ = float(val_)
+                    except (TypeError, ValueError):
+                        continue
+                if(val_ in val_dict):
+                    row_mask[val_dict[val_]] = True
+            if(op == "ne"):
+                row_mask = ~row_mask
+            return row_mask
+
+        # We compare the values as numbers (the values that are not numbers
+        # are not selected)
+        if(isinstance(key_data.dtype, pd.CategoricalDtype)):
+            num = pd.to_numeric(pd.Series(
+                key_data.cat.categories, dtype=object), errors="coerce")
+            num = np.append(num.to_numpy(dtype=float), np.nan)
+            num = num[key_data.cat.codes.to_numpy()]
+        else:
+            num = key_data.to_numpy(dtype=float)
+        with np.errstate(invalid="ignore"):
+            if(op == "lt"):
+                return num < float(val)
+            elif(op == "le"):
+                return num <= float(val)
+            elif(op == "gt"):
+                return num > float(val)
+            return num >= float(val)
+
+    def _index_value(self, val):
+        # We get the value of a key in the index: a number is always written
+        # in the same way (e.g., 1 for 1.0), so that a number has only one
+        # index, and a str is written as it is (the value None is "None")
+        if(val is None
+           or (isinstance(val, (float, np.floating)) and np.isnan(val))):
+            return "None"
+        if(isinstance(val, (bool, np.bool_))
+           or not(isinstance(val, (int, float, np.number)))):
+            return str(val)
+        if(isinstance(val, (int, np.integer))):
+            return str(int(val))
+        num = float(val)
+        if(not(np.isfinite(num))):
+            return str(val)
+        if(num.is_integer() and abs(num) < 2**53):
+            return str(int(num))
+        return repr(num)
+
+    def _create_index(self, index_dict):
         # We initialize the index
         index = ""
         # For each key,
         for key in sorted(list(index_dict.keys())):
-            # we add in the index the key and the values
+            # we add in the index the key and the value
             index += "{}={}/".format(
-                key, index_dict[key])
+                key, self._index_value(index_dict[key]))
         # We remove the last character "/"
         index = index[:-1]
         return index
 
+    def __rename_index(self, index_dict):
+
+        # If there is no data, there is nothing to rename
+        if(len(self.data) == 0):
+            return
+
+        # We get the (old) values of the keys for each index; we insert the
+        # new keys (in the new dictionary) with the value None
+        index_frame = self._index_frame.drop_duplicates(
+            ["row", "key"], keep="last")
+        key_list = sorted(set(index_frame["key"]) | set(index_dict.keys()))
+        val_data = index_frame.pivot(index="row", columns="key", values="val")
+        val_data = val_data.reindex(
+            index=range(len(self.data)), columns=key_list)
+        val_data = val_data.fillna("None")
+
+        # We create the new names of the indices (for all the rows at once)
+        index = None
+        for key in key_list:
+            key_val = key+"="+val_data[key].astype(str)
+            if(index is None):
+                index = key_val
+            else:
+                index = index+"/"+key_val
+
+        # and we rename them in the data
+        self.data.index = pd.Index(
+            index.to_numpy(), dtype=object, name=self.data.index.name)
+
     # ----------------------------------------------------------------------- #
     # Functions
 
     def index_keys(self, key=None, sort=None):
-        return self.do(self.__index_keys, key=key, sort=sort)
+        # NOTE: We read the data without the lock (see _load)
+        return self.__index_keys(key=key, sort=sort)
 
     def __index_keys(self, key=None, sort=None):
 
@@ -144,14 +576,17 @@ class NDData(Lock):
         else:
             key_list = list(self.index_dict[key].keys())
 
-        # We sort the keys
+        # We sort the keys (the value None is the last one)
+        none_list = [key_ for key_ in key_list if key_ is None]
+        key_list = [key_ for key_ in key_list if key_ is not None]
         key_list.sort(key=sort)
+        key_list += none_list
 
         # We return the keys
         return key_list
 
     def col_keys(self, sort=None):
-        return self.do(self.__col_keys, sort=sort)
+        return self.__col_keys(sort=sort)
 
     def __col_keys(self, sort=None):
         # We load the data
@@ -164,47 +599,24 @@ class NDData(Lock):
         return key_list
 
     def get(self, *args, **kwargs):
-        return self.do(self.__get, *args, **kwargs)
+        return self.__get(*args, **kwargs)
 
     def __get(self, *args, **kwargs):
-        # We load the data
-        self._load()
-
-        # We get the data with the columns in "args"
-        data = self._hidden_data[list(args)].copy(deep=True)
-
-        # We initialize the set of rows to select
-        row_set = set(range(len(data)))
-
-        # For each key and value(s) in "kwargs"
-        for key, val in kwargs.items():
-
-            # If we have only one value, we convert it in a list (with one
-            # element)
-            if(not(isinstance(val, list))):
-                val = [val]
-
-            # We initialize a set of rows to select for a given key/value(s)
-            new_row_set = set()
-
-            val_list = val
-            # For each value in the list of values
-            for val in val_list:
-                val = str(val)
-
-                # We add the rows in "new_row_set" for has the "value"
-                # associated with "key"
-                try:
-                    new_row_set = (
-                        set(self.index_dict[key][val]) | new_row_set)
-                except KeyError:
-                    pass
+        # If we read the file by chunks, we get the selected rows
+        if(self.chunksize is not None):
+            data, _ = self.__read_chunk(list(args), **kwargs)
+            data = data[list(args)]
+        else:
+            # We load the data (we only need the columns in "args")
+            self._load(list(args))
 
-            # We select the rows that are in "row_set" and "new_row_set"
-            row_set = row_set & new_row_set
+            # We select the rows
+            row_mask = self.__select_row(**kwargs)
 
-        # We get the data if the selected rows
-        data = data.iloc[list(row_set)]
+            # We get the data with the columns in "args" (for the selected
+            # rows)
+            data = self._hidden_data[list(args)].iloc[
+                np.flatnonzero(row_mask)]
         # We sort the rows by indices
         data = data.sort_index()
         # We remove the index column
@@ -212,91 +624,347 @@ class NDData(Lock):
         data = data.drop(columns=["index"])
         return data
 
+    def __select_row(self, **kwargs):
+
+        # We initialize the rows to select
+        row_mask = np.ones(len(self._hidden_data), dtype=bool)
+
+        # For each key and value(s) in "kwargs"
+        for key, val in kwargs.items():
+
+            # We get the key and the comparison (e.g., "lr__lt")
+            key, op = self._interpret_query(key, self.index_dict)
+
+            # If the key does not exist, we select no row
+            if(key not in self.index_dict):
+                row_mask[:] = False
+                continue
+
+            # We select the rows that have one of the selected values (and
+            # that are already selected)
+            row_mask &= self._select(
+                self._key_data[key], self.index_dict[key], op, val)
+
+        return row_mask
+
+    def __read_chunk(self, column_list, **kwargs):
+
+        # NOTE: The records of the journal cannot be read by chunks
+        if(os.path.exists(self._journal_file)):
+            raise RuntimeError(
+                "We must compact the journal to read the file by chunks")
+
+        # We keep the data in memory (that we restore after the chunks)
+        attr_list = [
+            "data", "_hidden_data", "_key_data", "_index_frame", "index_dict"]
+        attr_dict = {
+            attr: self.__dict__[attr]
+            for attr in attr_list if attr in self.__dict__}
+
+        # For each chunk of the file, we keep the selected rows (with the
+        # columns in "column_list" and the keys)
+        data_list = []
+        key_list = []
+        category_set = set()
+        found_set = set()
+        try:
+            for chunk in self.storage.read_chunk(
+                    self._path_file, self.chunksize, column_list):
+
+                # We initialize the data of the chunk and we select the rows
+                self.data = chunk
+                self._init_hidden_data()
+                self._init_index()
+                row_mask = self.__select_row(**kwargs)
+
+                # We keep the keys (and the keys that are categories in the
+                # chunk) and the columns (that are in the chunk)
+                for key in self.index_dict.keys():
+                    if(key not in key_list):
+                        key_list.append(key)
+                    if(isinstance(
+                            self._key_data[key].dtype, pd.CategoricalDtype)):
+                        category_set.add(key)
+                chunk_column_list = [
+                    col for col in dict.fromkeys(
+                        column_list+list(self.index_dict.keys()))
+                    if col in self._hidden_data]
+                found_set.update(chunk_column_list)
+                if(row_mask.any()):
+                    data_list.append(self._hidden_data[chunk_column_list].iloc[
+                        np.flatnonzero(row_mask)])
+        except FileNotFoundError:
+            # If the file does not exist (yet), there is no data
+            pass
+        finally:
+            # We restore the data in memory
+            for attr in attr_list:
+                self.__dict__.pop(attr, None)
+            self.__dict__.update(attr_dict)
+
+        # If a column does not exist (in all the chunks), we raise an error
+        # (as with the whole data)
+        missing_list = [
+            col for col in column_list
+            if col not in found_set and col not in key_list]
+        if(len(missing_list) > 0):
+            raise KeyError(f"{missing_list} not in the columns")
+
+        # We concatenate the selected rows
+        if(len(data_list) == 0):
+            return pd.DataFrame(
+                columns=list(dict.fromkeys(column_list+key_list))), key_list
+        data = pd.concat(data_list)
+
+        # The values of a key can have different types in the chunks (e.g.,
+        # numbers and categories), so we type them again: the key is numeric
+        # if it is numeric in all the chunks, and the values are categories
+        # (written as in the index) otherwise
+        for key in key_list:
+            if(key not in data):
+                continue
+            val = data[key]
+            if(key in category_set):
+                val_dict = {
+                    val_: self._index_value(val_)
+                    for val_ in pd.unique(val.dropna())}
+                data[key] = val.map(val_dict).astype("category")
+            else:
+                data[key] = pd.to_numeric(val)
+        return data, key_list
+
+    def aggregate(
+        self, col, by=None, over=None, funcs=None, pivot=None, **kwargs
+    ):
+        return self.__aggregate(
+            col, by=by, over=over, funcs=funcs,
+            pivot=pivot, **kwargs)
+
+    def __aggregate(
+        self, col, by=None, over=None, funcs=None, pivot=None, **kwargs
+    ):
+        # NOTE: We compute the functions "funcs" of the columns "col" for
+        # the rows with the same values of the keys in "by" (by default,
+        # all the keys that are not in "over", e.g., over="seed"); the rows
+        # are selected with "kwargs" (as in "get"). If "pivot" is a key (in
+        # "by"), its values are in the columns of the table. By default,
+        # funcs is ["mean", "std", "count"].
+        if(isinstance(col, str)):
+            col = [col]
+
+        # If we read the file by chunks, we get the selected rows
+        if(self.chunksize is not None):
+            data, key_list = self.__read_chunk(list(col), **kwargs)
+            by = self._interpret_by(by, over, key_list)
+            return self._aggregate(data, col, by, funcs, pivot)
+
+        # We load the data (we only need the columns in "col")
+        self._load(list(col))
+
+        # We get the keys of the groups
+        by = self._interpret_by(by, over, list(self.index_dict.keys()))
+
+        # We select the rows (we copy the data only if we need to)
+        row_mask = self.__select_row(**kwargs)
+        data = self._hidden_data
+        if(not(row_mask.all())):
+            data = data.iloc[np.flatnonzero(row_mask)]
+
+        return self._aggregate(data, col, by, funcs, pivot)
+
+    def _interpret_by(self, by, over, key_list):
+        # We get the keys of the groups (i.e., all the keys that are not in
+        # "over" by default)
+        if(isinstance(over, str)):
+            over = [over]
+        if(over is None):
+            over = []
+        if(isinstance(by, str)):
+            by = [by]
+        if(by is None):
+            by = [key for key in key_list if key not in over]
+        return by
+
+    def _aggregate(self, data, col, by, funcs, pivot):
+
+        # We get the functions (by default, the mean, the standard deviation
+        # and the number of values)
+        if(funcs is None):
+            funcs = ["mean", "std", "count"]
+
+        # If there is no group, we compute the functions on all the rows
+        if(len(by) == 0):
+            data = data[col].agg(funcs).unstack().to_frame().T
+            return data
+
+        # We compute the functions for each group
+        data = data.groupby(by, observed=True, dropna=False, sort=True)
+        data = data[col].agg(funcs)
+
+        # We put the values of the key "pivot" in the columns (if "pivot" is
+        # the only key, the table has one row)
+        if(pivot is not None):
+            data = data.unstack(pivot)
+            if(isinstance(data, pd.Series)):
+                return data.to_frame().T
+
+        # We put the values of the keys in the columns
+        return data.reset_index()
+
     def set(self, col_dict, index_dict, erase=False):
-        return self.do(self.__set, col_dict, index_dict, erase=erase)
+        return self.do(self.__set, [(col_dict, index_dict)], erase=erase)
 
-    def __set(self, col_dict, index_dict, erase=False):
+    def set_many(self, record_list, erase=False):
+        # NOTE: record_list is a list of (col_dict, index_dict), and we
+        # load and save the data only once for all the records
+        return self.do(self.__set, record_list, erase=erase)
 
-        # We load the data
+    def __set(self, record_list, erase=False):
+
+        # If we read the file by chunks, we cannot modify the data
+        if(self.chunksize is not None):
+            raise RuntimeError(
+                "We cannot modify the data when we read the file by chunks")
+
+        # If we have a journal, we only append the records in the journal
+        if(self.journal):
+            self.__save_journal(record_list, erase=erase)
+            return
+
+        # We load the data, we set the records and we save the data; the
+        # data in memory are not the ones of the file while we modify them
+        # (e.g., if we raise an error), so we will load the file again
         self._load()
+        self.__version = None
+        self.__set_record(record_list, erase=erase)
+        self._save()
 
-        # For each key,
-        for key in self.index_dict.keys():
-            # if it does not exist in the dictionary, we create it
-            if(key not in index_dict):
-                index_dict[key] = None
-        # We create the name of the index
-        index_name = self.__create_index(index_dict)
-
-        # For each index in the data
-        for old_index in self.data.index:
-            # We get the (old) dictionary associated with the index
-            old_index_dict = dict(self.__interpret_index(old_index))
-            # For each key in the new dictionary
-            for key in index_dict:
-                # We insert the new key if it's not in the (old) dictionary
-                if(key not in old_index_dict):
-                    old_index_dict[key] = None
-            # We create the new name of the index
-            new_index = self.__create_index(old_index_dict)
-            # and we rename it in the data
-            self.data = self.data.rename(index={old_index: new_index})
-
-        # If the index exists
-        if(index_name in self.data.index):
-
-            # If erase = "full", we erase the line associated to the index
-            if(erase == "full"):
-                for column in self.data.columns:
-                    self.data.at[index_name, column] = np.nan
-
-            # for all columns in the dictionary
-            for column, value in col_dict.items():
-
-                # We create the column in the data if it does not exist
-                if(column not in self.data.columns):
-                    # In order to do
-                    # self.data[column] = np.nan,
-                    # we execute the following lines
-                    # to remove a PerformanceWarning
-                    data_copy = self.data.copy()
-                    data_copy[column] = np.nan
-                    self.data = data_copy
+    def __set_record(self, record_list, erase=False):
+
+        # We get all the keys (in the data and in the records)
+        key_dict = {key: None for key in self.index_dict.keys()}
+        for col_dict, index_dict in record_list:
+            for key in index_dict.keys():
+                key_dict[key] = None
+
+        # We rename the indices in the data (with the new keys)
+        self.__rename_index(key_dict)
+
+        # For each record,
+        index_name_list = []
+        index_set = set(self.data.index)
+        new_column_list = []
+        for col_dict, index_dict in record_list:
+
+            # For each key, if it does not exist in the dictionary, we
+            # create it, and we create the name of the index
+            index_dict_ = dict(key_dict)
+            index_dict_.update(index_dict)
+            index_name = self._create_index(index_dict_)
+            index_name_list.append(index_name)
+
+            # We get the columns to create: in the order of the dictionary if
+            # the index exists, and sorted otherwise
+            column_list = list(col_dict.keys())
+            if(index_name not in index_set):
+                column_list = sorted(column_list)
+                index_set.add(index_name)
+            for column in column_list:
+                if(column not in self.data.columns
+                   and column not in new_column_list):
+                    new_column_list.append(column)
+
+        # We create the new columns (all at once)
+        if(len(new_column_list) > 0):
+            self.data = self.data.reindex(
+                columns=list(self.data.columns)+new_column_list)
+
+        # For each record,
+        new_row_dict = {}
+        for (col_dict, index_dict), index_name in zip(
+                record_list, index_name_list):
+
+            # If the index exists (in the data), we modify the row
+            if(index_name in self.data.index):
+
+                # If erase = "full", we erase the line associated to the index
+                if(erase == "full"):
+                    for column in self.data.columns:
+                        self.data.at[index_name, column] = np.nan
 
                 # We write the value in the right column and index
-                if(np.isnan(self.data.loc[index_name][column])
-                   or (not(np.isnan(self.data.loc[index_name][column]))
-                       and (erase == "partial" or erase == "full"))):
-                    self.data.at[index_name, column] = value
+                for column, value in col_dict.items():
+                    if(pd.isna(self.data.at[index_name, column])
+                       or erase == "partial" or erase == "full"):
+                        self.data.at[index_name, column] = value
+
+            # If the index exists (in the new rows), we modify the new row
+            elif(index_name in new_row_dict):
+                row = new_row_dict[index_name]
+                if(erase == "full"):
+                    for column in row.keys():
+                        row[column] = np.nan
+                for column, value in col_dict.items():
+                    if(pd.isna(row[column])
+                       or erase == "partial" or erase == "full"):
+                        row[column] = value
 
-        else:
             # Otherwise, we create the row and insert the values
-            old_set = set(self.data.columns)
-            new_set = set(col_dict.keys())
-            new_column = sorted(list(new_set))
-            new_set = sorted(list(old_set.difference(new_set)))
-
-            # We create the new columns
-            for column in new_set:
-                col_dict[column] = np.nan
-            for column in new_column:
-                if column not in self.data:
-                    # In order to do
-                    # self.data[column] = np.nan,
-                    # we execute the following lines
-                    # to remove a PerformanceWarning
-                    data_copy = self.data.copy()
-                    data_copy[column] = np.nan
-                    self.data = data_copy
-
-            # We add the values
-            self.data.loc[index_name] = col_dict
-
-        # We save the data
+            else:
+                row = {column: np.nan for column in self.data.columns}
+                row.update(col_dict)
+                new_row_dict[index_name] = row
+
+        # We add the new rows (all at once)
+        if(len(new_row_dict) > 0):
+            new_data = pd.DataFrame.from_dict(
+                new_row_dict, orient="index", columns=self.data.columns)
+            if(len(self.data) == 0):
+                self.data = new_data
+            else:
+                self.data = pd.concat([self.data, new_data])
+
+    def convert(self, file_, storage=None):
+        # We cannot convert the file in itself (we would take its lock twice)
+        if(os.path.realpath(file_) == os.path.realpath(self._path_file)):
+            raise ValueError("The new file must be different from the file")
+
+        # If the new file is a sqlite database, we insert all the rows
+        if(storage == "sqlite" or (storage is None and os.path.splitext(
+                file_)[1].lower() in [".sqlite", ".db"])):
+            return SQLiteNDData(file_).set_many(self.do(self.__record_list))
+
+        # Otherwise, we save the data in the new file (e.g., with another
+        # storage)
+        new_data = NDData(file_, storage=storage)
+        return self.do(new_data.do, new_data.__convert, self)
+
+    def __convert(self, data):
+        # We load the data (with the journal) and we save it in our file
+        data._load()
+        self.data = data.data
         self._save()
 
+    def __record_list(self):
+        # We load the data
+        self._load()
+
+        # We get the keys and the values for each row
+        index_list = [{} for _ in range(len(self.data))]
+        for row, key, val in self._index_frame.itertuples(index=False):
+            index_list[row][key] = val
+
+        # We get the columns for each row (without the missing values)
+        record_list = []
+        for i, row in enumerate(self.data.to_dict(orient="records")):
+            col_dict = {
+                column: val for column, val in row.items()
+                if not(pd.isna(val))}
+            record_list.append((col_dict, index_list[i]))
+        return record_list
+
     def __str__(self):
-        return self.do(self.__str)
+        return self.__str()
 
     def __str(self):
         # We print the data
@@ -305,17 +973,105 @@ class NDData(Lock):
     # ----------------------------------------------------------------------- #
 
     @staticmethod
-    def to_latex(data, fun, col_name_list=None, col_format="l"):
-        # We copy the data
-        data = data.copy(deep=True)
-        copy_data = data.copy(deep=True)
-
-        # For each value in the data
-        for i in list(data.index):
-            for col in list(data.columns):
-                # we run the function
-                data.loc[i, col] = fun(data.loc[i, col], i, col, copy_data)
-        # We change the name in the columns
+    def to_latex(
+        data, fun=None, col_name_list=None, col_format="l",
+        col_fun=None, digits=None, bold=None, mean_std=None
+    ):
+        # NOTE: The values of the table are formatted with:
+        # - fun(val, i, col, data) for each value (if fun is not None),
+        # - col_fun(column, col, data) for each column (or a dict
+        #   {col: col_fun}), and otherwise, "digits" significant digits for
+        #   the numbers (or the default format of the Styler, e.g., 0.500000),
+        # - mean_std: a dict {mean_col: std_col} to write "mean $\pm$ std"
+        #   in the column mean_col (and to remove std_col); if mean_std is
+        #   True, we merge the columns "mean" and "std" (from "aggregate"),
+        # - bold: "max" or "min" (or a dict {col: "max"/"min"}) to write
+        #   the best value of the (numeric) columns in bold; with "max" or
+        #   "min", we write in bold the columns mean_col of mean_std (if
+        #   mean_std is not None) or the columns of the values (i.e., not
+        #   the keys, the standard deviations and the counts from
+        #   "aggregate").
+
+        # We get the columns (and we apply the function for each value)
+        col_list = list(data.columns)
+        column_list = []
+        for j, col in enumerate(col_list):
+            column = data.iloc[:, j]
+            if(fun is not None):
+                column = pd.Series(
+                    [fun(val, i, col, data) for i, val in column.items()],
+                    index=data.index, dtype=object)
+            column_list.append(column)
+
+        # We get the columns "mean" and "std" to merge
+        if(mean_std is True):
+            mean_std = {}
+            for col in col_list:
+                if(isinstance(col, tuple) and "mean" in col):
+                    i = col.index("mean")
+                    std_col = col[:i]+("std",)+col[i+1:]
+                    if(std_col in col_list):
+                        mean_std[col] = std_col
+
+        # We get the best values (in bold) of the numeric columns
+        bold_list = []
+        for col, column in zip(col_list, column_list):
+            bold_ = bold
+            if(isinstance(bold, dict)):
+                bold_ = bold.get(col)
+            elif(mean_std is not None):
+                if(col not in mean_std):
+                    bold_ = None
+            elif(isinstance(col, tuple)
+                 and ("std" in col or "count" in col
+                      or all(c == "" for c in col[1:]))):
+                bold_ = None
+            bold_mask = None
+            if(bold_ is not None
+               and pd.api.types.is_numeric_dtype(column.dtype)):
+                best = column.max() if bold_ == "max" else column.min()
+                bold_mask = (column == best).to_numpy()
+            bold_list.append(bold_mask)
+
+        # We format the columns
+        for j, (col, column) in enumerate(zip(col_list, column_list)):
+            col_fun_ = col_fun
+            if(isinstance(col_fun, dict)):
+                col_fun_ = col_fun.get(col)
+            if(col_fun_ is not None):
+                column = pd.Series(
+                    col_fun_(column, col, data), index=data.index)
+            elif(digits is not None
+                 and pd.api.types.is_numeric_dtype(column.dtype)):
+                column = pd.Series(np.char.mod(
+                    f"%.{digits}g", column.to_numpy(dtype=float)),
+                    index=data.index)
+            else:
+                # We format the floats as the Styler would do (with
+                # "styler.format.precision" decimals, i.e., 0.500000)
+                precision = pd.get_option("styler.format.precision")
+                column = column.map(
+                    lambda val: f"{val:.{precision}f}"
+                    if(pd.api.types.is_float(val)) else val)
+            column_list[j] = column.astype(str)
+
+        # We merge the columns "mean" and "std"
+        if(mean_std is not None):
+            for mean_col, std_col in mean_std.items():
+                i = col_list.index(mean_col)
+                j = col_list.index(std_col)
+                column_list[i] = (
+                    column_list[i]+" $\\pm$ "+column_list[j])
+                del col_list[j], column_list[j], bold_list[j]
+
+        # We write the best values in bold
+        for column, bold_mask in zip(column_list, bold_list):
+            if(bold_mask is not None):
+                column[bold_mask] = "\\textbf{"+column[bold_mask]+"}"
+
+        # We create the table (and we change the name in the columns)
+        data = pd.concat(column_list, axis=1)
+        data.columns = pd.Index(col_list)
         if(col_name_list is not None):
             data.columns = col_name_list
 
@@ -324,3 +1080,425 @@ class NDData(Lock):
         s = s.hide(axis=0)
         return s.to_latex(
             column_format=col_format, hrules=True)
+
+
+###############################################################################
+
+
+class SQLiteNDData(NDData):
+
+    # NOTE: The data are saved in the table "data" of a sqlite database (in
+    # WAL mode, so that we can read while another process writes): the
+    # column "index" contains the index (as in the csv file), the columns
+    # "i/key" contain the values of the keys (as in the index), the columns
+    # "n/key" contain the values of the keys as numbers (or NULL), and the
+    # columns "c/col" contain the data; the columns of the keys are indexed
+    # to select the rows. We do not need the lock (i.e., sqlite handles the
+    # concurrency), but the WAL mode requires that the processes are on the
+    # same computer.
+
+    def __init__(self, file_, timeout=600.0):
+        Lock.__init__(self, file_)
+        self.timeout = timeout
+        self.__connection = None
+        self.__pid = None
+
+        # We keep the columns and the (typed) values of the keys while the
+        # database is not modified (i.e., while its data_version is the same)
+        self.__data_version = None
+        self.__cache_dict = {}
+
+    def _connect(self):
+        # We open a connection (one for each process)
+        if(self.__connection is None or self.__pid != os.getpid()):
+            self.__connection = sqlite3.connect(
+                self._path_file, timeout=self.timeout, isolation_level=None)
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS data ("
+                + "\"index\" TEXT PRIMARY KEY)")
+            self.__pid = os.getpid()
+            self.__data_version = None
+        return self.__connection
+
+    def __quote(self, name):
+        # We quote the name of a column
+        return "\"{}\"".format(name.replace("\"", "\"\""))
+
+    def __cache(self, connection):
+        # We get the cache (that we empty if the database was modified)
+        data_version = connection.execute(
+            "PRAGMA data_version").fetchone()[0]
+        if(data_version != self.__data_version):
+            self.__data_version = data_version
+            self.__cache_dict = {}
+        return self.__cache_dict
+
+    def __column_list(self, connection):
+        # We get the keys and the columns of the table (in the cache)
+        cache_dict = self.__cache(connection)
+        if("column_list" not in cache_dict):
+            key_list = []
+            column_list = []
+            for column in connection.execute("PRAGMA table_info(data)"):
+                if(column[1].startswith("i/")):
+                    key_list.append(column[1][2:])
+                elif(column[1].startswith("c/")):
+                    column_list.append(column[1][2:])
+            cache_dict["column_list"] = (key_list, column_list)
+        key_list, column_list = cache_dict["column_list"]
+        return list(key_list), list(column_list)
+
+    # ----------------------------------------------------------------------- #
+    # Functions
+
+    def index_keys(self, key=None, sort=None):
+        connection = self._connect()
+        key_list, _ = self.__column_list(connection)
+
+        # If "key" is None, we get the keys of the data
+        if(key is None):
+            key_list = list(key_list)
+        # If "key" is not None, we get the (typed) values for a given "key"
+        # (the integers are int, and the value None is the last one)
+        elif(key in key_list):
+            none_list = []
+            if(connection.execute(
+                "SELECT 1 FROM data WHERE {} = 'None' LIMIT 1".format(
+                    self.__quote("i/"+key))).fetchone() is not None):
+                none_list = [None]
+            key_list = []
+            for val in self.__type_key(connection, key):
+                if(isinstance(val, np.generic)):
+                    val = val.item()
+                if(isinstance(val, float) and val.is_integer()):
+                    val = int(val)
+                key_list.append(val)
+            key_list.sort(key=sort)
+            return key_list+none_list
+        else:
+            raise KeyError(key)
+
+        # We sort the keys
+        key_list.sort(key=sort)
+        return key_list
+
+    def col_keys(self, sort=None):
+        connection = self._connect()
+
+        # We get the columns of the data and we sort them
+        _, key_list = self.__column_list(connection)
+        key_list.sort(key=sort)
+        return key_list
+
+    def get(self, *args, **kwargs):
+        connection = self._connect()
+        key_list, column_list = self.__column_list(connection)
+
+        # We get the columns in "args" (the columns or the keys, as numbers
+        # if the key is numeric)
+        select_list = []
+        for arg in args:
+            if(arg in key_list):
+                if(self.__type_key(connection, arg).dtype != object):
+                    select_list.append(self.__quote("n/"+arg))
+                else:
+                    select_list.append(self.__quote("i/"+arg))
+            elif(arg in column_list):
+                select_list.append(self.__quote("c/"+arg))
+            else:
+                raise KeyError(f"{arg} is not in the columns")
+            select_list[-1] += " AS "+self.__quote(arg)
+        if(len(select_list) == 0):
+            select_list = ["NULL"]
+
+        # For each key and value(s) in "kwargs", we select the rows that have
+        # the value(s) associated with the key
+        where_list = []
+        param_list = []
+        for key, val in kwargs.items():
+
+            # We get the key and the comparison (e.g., "lr__lt")
+            key_, op = self._interpret_query(key, key_list)
+            if(key_ not in key_list):
+                where_list.append("0")
+                continue
+            key = self.__quote("i/"+key_)
+            num_key = self.__quote("n/"+key_)
+
+            # We select the values (with the indexed columns): as numbers if
+            # the key is numeric, and as in the index otherwise (the value
+            # None selects the rows without the key)
+            if(op == "eq" or op == "ne"):
+                numeric = (self.__type_key(connection, key_).dtype != object)
+                if(not(isinstance(val, list))):
+                    val = [val]
+                val_list = []
+                none = False
+                for val_ in val:
+                    if(val_ is None
+                       or (isinstance(val_, str) and val_ == "None")):
+                        none = True
+                    elif(numeric):
+                        val_ = self.__to_number(val_)
+                        if(val_ is not None):
+                            val_list.append(val_)
+                    else:
+                        val_list.append(self._index_value(val_))
+                select_list_ = []
+                if(len(val_list) > 0):
+                    select_list_.append("{} IN ({})".format(
+                        num_key if numeric else key,
+                        ", ".join(["?"]*len(val_list))))
+                    param_list += val_list
+                if(none):
+                    select_list_.append(f"{key} = 'None'")
+                if(len(select_list_) == 0):
+                    select_list_.append("0")
+                select = " OR ".join(select_list_)
+                if(op == "ne"):
+                    select = f"NOT COALESCE({select}, 0)"
+                where_list.append(f"({select})")
+            else:
+                op = {"lt": "<", "le": "<=", "gt": ">", "ge": ">="}[op]
+                where_list.append(f"{num_key} {op} ?")
+                param_list.append(float(val))
+
+        # We get the data of the selected rows (sorted by indices)
+        query = "SELECT {} FROM data".format(", ".join(select_list))
+        if(len(where_list) > 0):
+            query += " WHERE "+" AND ".join(where_list)
+        query += " ORDER BY \"index\""
+        data = pd.read_sql_query(query, connection, params=param_list)
+        if(len(args) == 0):
+            data = data[[]]
+
+        # We type the values of the keys (as numbers or categories)
+        for i, arg in enumerate(args):
+            if(arg in key_list):
+                key_data = self.__type_key(connection, arg)
+                val = data.iloc[:, i]
+                if(key_data.dtype != object):
+                    val = pd.to_numeric(val)
+                else:
+                    val = pd.Categorical(
+                        val.where(val != "None"), categories=key_data)
+                data.isetitem(i, val)
+        return data
+
+    def aggregate(
+        self, col, by=None, over=None, funcs=None, pivot=None, **kwargs
+    ):
+        if(isinstance(col, str)):
+            col = [col]
+
+        # We get the keys of the groups and the data (of the selected rows)
+        by = self._interpret_by(by, over, self.index_keys())
+        data = self.get(*col, *by, **kwargs)
+
+        return self._aggregate(data, col, by, funcs, pivot)
+
+    def set(self, col_dict, index_dict, erase=False):
+        return self.set_many([(col_dict, index_dict)], erase=erase)
+
+    def set_many(self, record_list, erase=False):
+        connection = self._connect()
+
+        # We write all the records in one transaction (and the cache is not
+        # valid anymore)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.__set(connection, record_list, erase=erase)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            self.__cache_dict = {}
+        connection.execute("COMMIT")
+
+    def __set(self, connection, record_list, erase=False):
+        key_list, column_list = self.__column_list(connection)
+
+        # We create the new keys (with the value None for the existing rows)
+        # and the new columns
+        new_key_list = []
+        for col_dict, index_dict in record_list:
+            for key in index_dict.keys():
+                key = key.replace("-", "_")
+                if(key not in key_list and key not in new_key_list):
+                    new_key_list.append(key)
+            for column in col_dict.keys():
+                if(column not in column_list):
+                    connection.execute(
+                        "ALTER TABLE data ADD COLUMN {}".format(
+                            self.__quote("c/"+column)))
+                    column_list.append(column)
+        for key in new_key_list:
+            connection.execute(
+                "ALTER TABLE data ADD COLUMN {} TEXT DEFAULT 'None'".format(
+                    self.__quote("i/"+key)))
+            connection.execute("CREATE INDEX {} ON data ({})".format(
+                self.__quote("data/i/"+key), self.__quote("i/"+key)))
+            connection.execute("ALTER TABLE data ADD COLUMN {} REAL".format(
+                self.__quote("n/"+key)))
+            connection.execute("CREATE INDEX {} ON data ({})".format(
+                self.__quote("data/n/"+key), self.__quote("n/"+key)))
+        key_list = sorted(key_list+new_key_list)
+
+        # We rename the indices (with the new keys)
+        if(len(new_key_list) > 0):
+            index = " || '/' || ".join([
+                "'{}=' || {}".format(
+                    key.replace("'", "''"), self.__quote("i/"+key))
+                for key in key_list])
+            connection.execute(f"UPDATE data SET \"index\" = {index}")
+
+        # For each record,
+        for col_dict, index_dict in record_list:
+
+            # We create the name of the index
+            index_dict_ = {key: None for key in key_list}
+            for key, val in index_dict.items():
+                index_dict_[key.replace("-", "_")] = val
+            index_name = self._create_index(index_dict_)
+
+            # If the index exists, we modify the row
+            row = connection.execute(
+                "SELECT 1 FROM data WHERE \"index\" = ?",
+                (index_name,)).fetchone()
+            if(row is not None):
+
+                # If erase = "full", we erase the line associated to the index
+                set_list = []
+                param_list = []
+                if(erase == "full"):
+                    for column in column_list:
+                        if(column not in col_dict):
+                            set_list.append(
+                                "{} = NULL".format(self.__quote("c/"+column)))
+
+                # We write the value in the right column (if there is no
+                # value or if we erase it)
+                for column, value in col_dict.items():
+                    column = self.__quote("c/"+column)
+                    if(erase == "partial" or erase == "full"):
+                        set_list.append(f"{column} = ?")
+                    else:
+                        set_list.append(
+                            f"{column} = COALESCE({column}, ?)")
+                    param_list.append(self.__to_sql(value))
+                if(len(set_list) > 0):
+                    connection.execute(
+                        "UPDATE data SET {} WHERE \"index\" = ?".format(
+                            ", ".join(set_list)),
+                        param_list+[index_name])
+
+            # Otherwise, we create the row and insert the values
+            else:
+                name_list = ["\"index\""]
+                param_list = [index_name]
+                for key in key_list:
+                    val = self._index_value(index_dict_[key])
+                    name_list += [
+                        self.__quote("i/"+key), self.__quote("n/"+key)]
+                    param_list += [val, self.__to_number(val)]
+                for column, value in col_dict.items():
+                    name_list.append(self.__quote("c/"+column))
+                    param_list.append(self.__to_sql(value))
+                connection.execute(
+                    "INSERT INTO data ({}) VALUES ({})".format(
+                        ", ".join(name_list),
+                        ", ".join(["?"]*len(name_list))),
+                    param_list)
+
+    def compact(self):
+        # There is no journal (as in NDData), but we write the records of the
+        # WAL file in the database (and we empty the WAL file)
+        connection = self._connect()
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def convert(self, file_, storage=None):
+        # We cannot convert the database in itself
+        if(os.path.realpath(file_) == os.path.realpath(self._path_file)):
+            raise ValueError("The new file must be different from the file")
+
+        # We insert all the rows in the new file (a sqlite database or a
+        # file with another storage)
+        if(storage == "sqlite" or (storage is None and os.path.splitext(
+                file_)[1].lower() in [".sqlite", ".db"])):
+            new_data = SQLiteNDData(file_)
+        else:
+            new_data = NDData(file_, storage=storage)
+        return new_data.set_many(self.__record_list(self._connect()))
+
+    def __record_list(self, connection):
+        key_list, column_list = self.__column_list(connection)
+
+        # We get the keys and the columns of each row (without the missing
+        # values)
+        select_list = [self.__quote("i/"+key) for key in key_list]
+        select_list += [self.__quote("c/"+column) for column in column_list]
+        if(len(select_list) == 0):
+            return []
+        record_list = []
+        for row in connection.execute(
+                "SELECT {} FROM data ORDER BY rowid".format(
+                    ", ".join(select_list))):
+            index_dict = dict(zip(key_list, row[:len(key_list)]))
+            col_dict = {
+                column: val for column, val in zip(
+                    column_list, row[len(key_list):])
+                if val is not None}
+            record_list.append((col_dict, index_dict))
+        return record_list
+
+    def __type_key(self, connection, key):
+        # We get the (sorted) values of a key (in the cache): they are
+        # numbers if all the values are numbers, and str otherwise (without
+        # the value None)
+        cache_dict = self.__cache(connection)
+        if(("key", key) not in cache_dict):
+            num_key = self.__quote("n/"+key)
+            key_ = self.__quote("i/"+key)
+            if(connection.execute(
+                f"SELECT 1 FROM data WHERE {num_key} IS NULL"
+                    + f" AND {key_} != 'None' LIMIT 1").fetchone() is None):
+                val = pd.Index([val for (val,) in connection.execute(
+                    f"SELECT DISTINCT {num_key} FROM data"
+                    + f" WHERE {num_key} IS NOT NULL ORDER BY {num_key}")],
+                    dtype=float)
+            else:
+                val = pd.Index(sorted([val for (val,) in connection.execute(
+                    f"SELECT DISTINCT {key_} FROM data"
+                    + f" WHERE {key_} != 'None'")]), dtype=object)
+            cache_dict[("key", key)] = val
+        return cache_dict[("key", key)]
+
+    def __to_number(self, value):
+        # We convert the value of a key in a number (if we can)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def __to_sql(self, value):
+        # We convert the numpy values (and NaN is NULL)
+        if(isinstance(value, np.generic)):
+            value = value.item()
+        if(isinstance(value, float) and np.isnan(value)):
+            return None
+        return value
+
+    def __str__(self):
+        # We print the data
+        connection = self._connect()
+        _, column_list = self.__column_list(connection)
+        select_list = ["\"index\""]+[
+            self.__quote("c/"+column)+" AS "+self.__quote(column)
+            for column in column_list]
+        data = pd.read_sql_query(
+            "SELECT {} FROM data ORDER BY rowid".format(
+                ", ".join(select_list)),
+            connection, index_col="index")
+        data.index.name = None
+        return str(data)
@@ -5,6 +5,9 @@
 
 import os
 import re
+import sys
+import json
+import hashlib
 import time
 import itertools
 import argparse
@@ -13,23 +16,38 @@ import subprocess
 import time
 import logging
 import glob
+import shutil
+import socket
+import heapq
+import threading
+import concurrent.futures
 
 # Useful packages in the .ini files
 import numpy as np
 import math
 
+from lock import Lock
+
 ###############################################################################
 
 
 class LaunchConfig():
 
-    def __init__(self, f, job_id_list):
+    def __init__(self, f, job_id_list, state_dir=None, resume=False):
         # We set the prefix of the job names (useful for slurm ...)
         self.prefix_run_name = "job_{}_".format(int(time.time()))
 
         # We save the ids of the jobs to execute
         self.job_id_list = job_id_list
 
+        # NOTE: If state_dir is not None, the exit status (and the runtime)
+        # of each job is saved in the file state_dir/<hash of the job>, where
+        # the hash of the job does not depend on the run and job ids; if
+        # resume is True, we skip the jobs that succeeded in a previous run
+        # (and the jobs that depend on them do not wait for them).
+        self.state_dir = state_dir
+        self.resume = resume
+
         # We read the configuration file (.ini)
         config = configparser.ConfigParser(empty_lines_in_values=False)
         config.read(f)
@@ -138,9 +156,10 @@ class LaunchConfig():
         # We get the params(, the variables and the command...)
         param_list = dict(param_list)
 
-        # We remove the command
-        if("command" in param_list):
-            del param_list["command"]
+        # We remove the command (and the resources)
+        for key in ["command", "cpus", "mem"]:
+            if(key in param_list):
+                del param_list[key]
         # We remove the variables
         for key in list(param_list.keys()):
             if(re.match("[$]{[^}]+}", key)):
@@ -259,6 +278,71 @@ class LaunchConfig():
         if("command" in job_tree[2]):
             return job_tree[2]["command"]
 
+    def _get_resource(self, job_tree, var_list):
+        # We get the resources of the current job (i.e., the number of cpus
+        # and the memory), which can contain variables
+        resource_dict = {}
+        for resource in ["cpus", "mem"]:
+            if(resource in job_tree[2]):
+                resource_dict[resource] = self._construct_command(
+                    job_tree[2][resource], var_list)
+        return resource_dict
+
+    def _get_hash(self, job_tree, param_list, section_list):
+        # We get the hash of the job with the name of the job, its section,
+        # its params (without the run and job ids, which change at each run)
+        # and the sections of the previous jobs; the variables are not
+        # expanded (since they can contain the run and job ids), but they
+        # only depend on the sections and the params
+        job_dict = {
+            "name": job_tree[0],
+            "section": dict(job_tree[2]),
+            "param": {
+                key: str(val) for key, val in param_list.items()
+                if key not in ["run_id", "job_id"]},
+            "parent": section_list,
+        }
+        job_str = json.dumps(job_dict, sort_keys=True)
+        return hashlib.sha1(job_str.encode("utf-8")).hexdigest()
+
+    def _get_state(self, job_hash):
+        # We get the exit status and the runtime of the job (if the job has
+        # finished in a previous run)
+        if(self.state_dir is None):
+            return None
+        try:
+            with open(os.path.join(self.state_dir, job_hash), "r") as f:
+                status, runtime = f.read().split()
+            return int(status), float(runtime)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save_state(self, job_hash, status, runtime):
+        # We save the exit status and the runtime of the job (in a temporary
+        # file that replaces the old one)
+        if(self.state_dir is None or job_hash is None):
+            return
+        os.makedirs(self.state_dir, exist_ok=True)
+        state_file = os.path.join(self.state_dir, job_hash)
+        tmp_file = "{}.{}.tmp".format(state_file, os.getpid())
+        with open(tmp_file, "w") as f:
+            f.write("{} {}\n".format(status, runtime))
+        os.replace(tmp_file, state_file)
+
+    def _wrap_command(self, command, job_hash):
+        # We wrap the command so that the job saves its exit status and its
+        # runtime itself (e.g., on a cluster)
+        if(self.state_dir is None or job_hash is None):
+            return command
+        state_dir = os.path.abspath(self.state_dir)
+        os.makedirs(state_dir, exist_ok=True)
+        state_file = os.path.join(state_dir, job_hash)
+        return (
+            "T=$(date +%s); ( {} ); S=$?; "
+            + "echo \"$S $(( $(date +%s) - T ))\" > {}.$$.tmp; "
+            + "mv {}.$$.tmp {}; exit $S").format(
+                command, state_file, state_file, state_file)
+
     def _construct_command(self, command, var_list):
         # For each variable
         for var_name in var_list:
@@ -274,9 +358,14 @@ class LaunchConfig():
             self._run(prog_subtree, prog_subtree[2], {}, {}, [])
 
     def _run(self, job_tree, param_list,
-             known_param, known_var, known_dependency
+             known_param, known_var, known_dependency, known_section=None
              ):
 
+        # We keep the sections of the previous jobs (for the hash of the
+        # jobs)
+        if(known_section is None):
+            known_section = []
+
         # We keep the old parameters to check if there is a problem
         old_param_list = param_list
 
@@ -317,7 +406,7 @@ class LaunchConfig():
                 # parameters (to run the new loops ...)
                 self._run(
                     job_tree, todo_param_list, known_param_,
-                    known_var, known_dependency)
+                    known_var, known_dependency, known_section)
                 continue
 
             # We increase the run index
@@ -339,14 +428,24 @@ class LaunchConfig():
             command = self._get_command(job_tree)
 
             # If the command exists
+            skip = False
             if(command is not None):
                 # We interpret the command (with the variables)
                 command = self._construct_command(command, var_)
 
+                # We skip the job if it succeeded in a previous run (if we
+                # resume the runs)
+                job_hash = self._get_hash(job_tree, param_, known_section)
+                state = self._get_state(job_hash)
+                skip = self.resume and state is not None and state[0] == 0
+
                 # We run the command if the job id is in the list
-                if(self.job_id_list is None
-                   or self.__run_index in self.job_id_list):
-                    self._run_command(command, run_name, known_dependency)
+                if((self.job_id_list is None
+                   or self.__run_index in self.job_id_list)
+                   and not(skip)):
+                    self._run_command(
+                        command, run_name, known_dependency,
+                        self._get_resource(job_tree, var_), job_hash)
 
             # Otherwise, if the command does not exist,
             # we decrease the run index
@@ -361,7 +460,7 @@ class LaunchConfig():
                 # the job id in the dependencies
                 if((self.job_id_list is None
                    or self.__run_index in self.job_id_list)
-                   and command is not None):
+                   and command is not None and not(skip)):
                     new_known_dependency = known_dependency+[run_name]
                 else:
                     new_known_dependency = known_dependency
@@ -369,7 +468,8 @@ class LaunchConfig():
                 # We run recursively the subtree (and we get the dependency)
                 dependency_ = self._run(
                     job_subtree, job_subtree[2], param_,
-                    var_, new_known_dependency)
+                    var_, new_known_dependency,
+                    known_section+[dict(job_tree[2])])
 
                 # We add the new dependencies in the list
                 dependency_1 = sorted(
@@ -380,7 +480,7 @@ class LaunchConfig():
             # id is in the list (and if the command exists)
             if((self.job_id_list is None
                or self.__run_index in self.job_id_list)
-               and command is not None):
+               and command is not None and not(skip)):
                 dependency_1.append(run_name)
                 dependency_1 = sorted(
                     list(set(dependency_1)),
@@ -407,7 +507,10 @@ class LaunchConfig():
         # We return the dependencies of the node
         return dependency_2
 
-    def _run_command(self, command, run_name=None, job_list=None):
+    def _run_command(
+        self, command, run_name=None, job_list=None, resource_dict=None,
+        job_hash=None
+    ):
         # To be implemented!
         raise NotImplementedError
 
@@ -416,10 +519,16 @@ class LaunchConfig():
 
 class PrintLaunchConfig(LaunchConfig):
 
-    def _run_command(self, command, run_name=None, dependency=None):
+    def _run_command(
+        self, command, run_name=None, dependency=None, resource_dict=None,
+        job_hash=None
+    ):
         # We create the message
         msg = "Job: {}".format(run_name)
         msg += " - Dependency: {}".format(", ".join(dependency))
+        if(resource_dict is not None and len(resource_dict) > 0):
+            msg += " - Resource: {}".format(", ".join(
+                f"{key}={val}" for key, val in resource_dict.items()))
 
         # We print the message
         logging.info(msg+"\n")
@@ -433,22 +542,329 @@ class PrintLaunchConfig(LaunchConfig):
 
 class LocalLaunchConfig(LaunchConfig):
 
-    def _run_command(self, command, run_name=None, job_list=None):
-        # We execute the command in the shell
-        subprocess.call(command, shell=True)
+    # We set the number of threads of these libraries (OpenMP, MKL, ...) to
+    # the number of cpus of the job
+    THREAD_ENV_LIST = [
+        "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+        "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS"]
+
+    def __init__(
+        self, f, job_id_list, worker=None, log_dir="output",
+        cpus=None, mem=None, mem_check=False, pin=False,
+        state_dir=None, resume=False
+    ):
+        super().__init__(f, job_id_list, state_dir=state_dir, resume=resume)
+        # NOTE: If worker is not None, we run (at most) "worker" jobs at the
+        # same time, and the output of each job is written in the file
+        # log_dir/<run_name>.out
+        self.worker = worker
+        self.log_dir = log_dir
+
+        # NOTE: A job is run only if the cpus and the memory that it needs
+        # (given by "cpus" and "mem" in its section, by default, 1 cpu and
+        # no memory) are free; by default, we use all the cpus and the
+        # memory of the computer. If mem_check is True, we also check the
+        # available memory of the computer before running a job.
+        if(cpus is None):
+            cpus = len(self.__get_cpu_list())
+        self.cpus = cpus
+        if(mem is None):
+            mem = self.__get_meminfo("MemTotal")
+        else:
+            mem = self._interpret_mem(mem)
+        self.mem = mem
+        self.mem_check = mem_check
+
+        # NOTE: If pin is True, each job runs on its own cores (as many as
+        # its cpus) and the libraries (OpenMP, MKL, ...) use as many threads
+        # as its cpus. The cores are set with taskset (before the command
+        # starts) or, if taskset does not exist, with os.sched_setaffinity
+        # once the shell of the command is started.
+        self.pin = pin
+        self.__taskset = None
+        if(self.pin):
+            self.__taskset = shutil.which("taskset")
+
+        # We save the exit status of the jobs
+        self.status_dict = {}
+
+    def run(self):
+        # If we run the jobs one after another, we run them directly
+        if(self.worker is None):
+            return super().run()
+
+        # Otherwise, we get the jobs of the tree (with the jobs on which they
+        # depend)
+        self.__job_dict = {}
+        super().run()
+
+        # We count, for each job, the jobs on which it depends, and we keep,
+        # for each job, the jobs that depend on it
+        index_dict = {}
+        count_dict = {}
+        child_dict = {run_name: [] for run_name in self.__job_dict}
+        ready_list = []
+        for i, (run_name, (_, job_list, _, _, _)) in enumerate(
+                self.__job_dict.items()):
+            index_dict[run_name] = i
+            job_list = [
+                run_name_ for run_name_ in set(job_list)
+                if run_name_ in child_dict]
+            count_dict[run_name] = len(job_list)
+            for run_name_ in job_list:
+                child_dict[run_name_].append(run_name)
+            # The jobs that do not depend on other jobs are ready
+            if(count_dict[run_name] == 0):
+                heapq.heappush(ready_list, (i, run_name))
+
+        # We run the jobs in a pool of workers: a job is run as soon as the
+        # jobs on which it depends are finished and the resources that it
+        # needs are free (and the ready jobs are run in the order of the ids)
+        self.__cpus_used = 0
+        self.__mem_used = 0
+        self.__core_list = []
+        if(self.pin):
+            self.__core_list = self.__get_cpu_list()[:self.cpus]
+        core_dict = {}
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.worker) as executor:
+            future_dict = {}
+            while(len(ready_list) > 0 or len(future_dict) > 0):
+
+                # We run the ready jobs (if there are free workers and if
+                # we can admit them)
+                wait_list = []
+                while(len(ready_list) > 0 and len(future_dict) < self.worker):
+                    i, run_name = heapq.heappop(ready_list)
+                    _, _, cpus, mem, _ = self.__job_dict[run_name]
+                    if(not(self.__admit(cpus, mem, len(future_dict)))):
+                        wait_list.append((i, run_name))
+                        continue
+                    self.__cpus_used += cpus
+                    self.__mem_used += mem
+                    core_dict[run_name] = self.__get_core(cpus)
+                    future = executor.submit(
+                        self.__run_job, self.__job_dict[run_name][0],
+                        run_name, cpus, core_dict[run_name],
+                        self.__job_dict[run_name][4])
+                    future_dict[future] = run_name
+                for i, run_name in wait_list:
+                    heapq.heappush(ready_list, (i, run_name))
+
+                # We wait for (at least) one job to finish (if we check the
+                # available memory, we check it again after a while)
+                timeout = None
+                if(self.mem_check and len(ready_list) > 0):
+                    timeout = 1.0
+                done_set, _ = concurrent.futures.wait(
+                    future_dict, timeout=timeout,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+
+                # The resources of the finished jobs are free and the jobs
+                # that depend only on finished jobs are now ready
+                for future in done_set:
+                    run_name = future_dict.pop(future)
+                    future.result()
+                    _, _, cpus, mem, _ = self.__job_dict[run_name]
+                    self.__cpus_used -= cpus
+                    self.__mem_used -= mem
+                    self.__release_core(core_dict.pop(run_name))
+                    for run_name_ in child_dict[run_name]:
+                        count_dict[run_name_] -= 1
+                        if(count_dict[run_name_] == 0):
+                            heapq.heappush(
+                                ready_list, (index_dict[run_name_], run_name_))
+
+        # We print the jobs that failed
+        for run_name, status in self.status_dict.items():
+            if(status != 0):
+                logging.info("Job: {} - Failed with exit status {}\n".format(
+                    run_name, status))
+
+    def _run_command(
+        self, command, run_name=None, job_list=None, resource_dict=None,
+        job_hash=None
+    ):
+
+        # If we run the jobs one after another, we execute the command in
+        # the shell
+        if(self.worker is None):
+            start_time = time.time()
+            status = subprocess.call(command, shell=True)
+            self.status_dict[run_name] = status
+            self._save_state(job_hash, status, time.time()-start_time)
+            return
+
+        # We get the resources of the job
+        if(resource_dict is None):
+            resource_dict = {}
+        try:
+            cpus = int(resource_dict.get("cpus", 1))
+        except ValueError:
+            cpus = 0
+        if(cpus < 1):
+            raise RuntimeError(
+                "The number of cpus {} is not correct".format(
+                    resource_dict["cpus"]))
+        mem = self._interpret_mem(resource_dict.get("mem", 0))
+
+        # We keep the job (and a copy of the jobs on which it depends) to run
+        # it later
+        self.__job_dict[run_name] = (
+            command, list(job_list), cpus, mem, job_hash)
+
+    def __admit(self, cpus, mem, running):
+
+        # If no job is running, we run the job (even if it needs more than
+        # the resources of the computer)
+        if(running == 0):
+            return True
+
+        # We check that the resources are free
+        if(self.__cpus_used+cpus > self.cpus
+           or self.__mem_used+mem > self.mem):
+            return False
+
+        # We check the available memory of the computer (if we need to)
+        if(self.mem_check and mem > 0):
+            mem_available = self.__get_meminfo("MemAvailable")
+            if(mem_available < mem):
+                return False
+        return True
+
+    def __get_cpu_list(self):
+        # We get the cpus on which we can run the jobs (all the cpus of the
+        # computer if we cannot get them, e.g., on macOS)
+        try:
+            return sorted(os.sched_getaffinity(0))
+        except AttributeError:
+            return list(range(os.cpu_count() or 1))
+
+    def __get_core(self, cpus):
+        # If we do not pin the jobs, the job can use all the cores
+        if(not(self.pin)):
+            return None
+        # We take the first free cores (if there are not enough free cores,
+        # e.g., when the job needs more cpus than the computer, the job can
+        # use all the cores)
+        if(len(self.__core_list) < cpus):
+            return None
+        core_list = self.__core_list[:cpus]
+        self.__core_list = self.__core_list[cpus:]
+        return core_list
+
+    def __release_core(self, core_list):
+        # The cores of the job are free again
+        if(core_list is not None):
+            self.__core_list = sorted(self.__core_list+core_list)
+
+    def _interpret_mem(self, mem):
+        # We get the memory in bytes (the unit is K, M, G or T, and M by
+        # default, as in slurm)
+        re_match = re.match(
+            r"^\s*(\d+(?:\.\d*)?)\s*([KMGT]?)B?\s*$", str(mem), re.IGNORECASE)
+        if(not(re_match)):
+            raise RuntimeError(
+                "The memory {} is not correct".format(mem))
+        unit = re_match.group(2).upper()
+        if(unit == ""):
+            unit = "M"
+        return int(float(re_match.group(1))*1024**("KMGT".index(unit)+1))
+
+    def __get_meminfo(self, name):
+        # We get the memory (in bytes) in /proc/meminfo (or no limit if we
+        # cannot read it)
+        try:
+            with open("/proc/meminfo", "r") as f:
+                for line in f:
+                    if(line.startswith(name+":")):
+                        return int(line.split()[1])*1024
+        except OSError:
+            pass
+        return float("inf")
+
+    def __run_job(
+        self, command, run_name, cpus=1, core_list=None, job_hash=None
+    ):
+
+        # If we pin the job, we set the number of threads of the libraries
+        # and the cores on which the job (and its children) runs (with
+        # taskset, since we cannot run code in the child process safely
+        # from a thread, e.g., with preexec_fn)
+        env = None
+        args = command
+        if(self.pin):
+            env = dict(os.environ)
+            for thread_env in self.THREAD_ENV_LIST:
+                env[thread_env] = str(cpus)
+        if(core_list is not None and self.__taskset is not None):
+            core = ",".join(str(core) for core in core_list)
+            args = [self.__taskset, "-c", core, "/bin/sh", "-c", command]
+
+        # We execute the command in the shell (with the output in the log
+        # file)
+        os.makedirs(self.log_dir, exist_ok=True)
+        log_file = os.path.join(self.log_dir, run_name+".out")
+        logging.info("Job: {} - Executing {}\n".format(run_name, command))
+        start_time = time.time()
+        with open(log_file, "w") as f:
+            process = subprocess.Popen(
+                args, shell=isinstance(args, str), stdout=f,
+                stderr=subprocess.STDOUT, env=env)
+            # If taskset does not exist, we set the cores of the shell (once
+            # it is started)
+            if(core_list is not None and self.__taskset is None):
+                os.sched_setaffinity(process.pid, core_list)
+            status = process.wait()
+
+        # We save the exit status (and the state of the job)
+        self.status_dict[run_name] = status
+        self._save_state(job_hash, status, time.time()-start_time)
+        logging.info("Job: {} - Exit status {}\n".format(run_name, status))
 
 
 ###############################################################################
 
-class SlurmLaunchConfig(LaunchConfig):
+class ClusterLaunchConfig(LaunchConfig):
+
+    # NOTE: The name of the cluster (i.e., of the configuration files)
+    NAME = None
 
-    def __init__(self, f, job_id_list, config, queue, sleep):
-        super().__init__(f, job_id_list)
+    def __init__(
+        self, f, job_id_list, config, queue, sleep,
+        state_dir=None, resume=False, pack=None, pilot=None, submit=None
+    ):
+        super().__init__(f, job_id_list, state_dir=state_dir, resume=resume)
         self.config = config
         self.queue = queue
         self.sleep = sleep
         self.__job_id_dict = {}
 
+        # NOTE: If queue is not None, a poller (thread) gets the number of
+        # jobs in the queue every "sleep" seconds, and we submit the jobs
+        # while there are free slots in the queue (that we count between two
+        # polls)
+        self.__queue_condition = threading.Condition()
+        self.__queue_size = None
+        self.__poller = None
+        self.__poller_stop = threading.Event()
+
+        # NOTE: If pack is not None, the jobs with the same dependencies are
+        # submitted in packs of (at most) "pack" jobs; the jobs of a pack are
+        # run (in one job) at the same time on the allocated cpus
+        self.pack = pack
+
+        # NOTE: If pilot is not None, the jobs are written in a queue (on the
+        # shared disk), and we submit "pilot" workers that run the jobs of
+        # the queue (as soon as the jobs on which they depend are finished)
+        # until the queue is empty
+        self.pilot = pilot
+
+        # NOTE: If submit is not None, we run (at most) "submit" submissions
+        # at the same time; a job is submitted as soon as the jobs on which
+        # it depends are submitted (i.e., when we know their ids)
+        self.submit = submit
+
     def get_job_id(self, run_name):
         # We get the id of a job in the dict given the job name
         try:
@@ -460,6 +876,287 @@ class SlurmLaunchConfig(LaunchConfig):
         # We get the id of a job in the dict given the job name
         self.__job_id_dict[run_name] = job_id
 
+    def get_job_queue_size(self):
+        # To be implemented!
+        raise NotImplementedError
+
+    def _get_config_file(self):
+
+        # We get the default configuration file
+        config_dir = os.environ.get("MLTOOLS_PATH", ".")
+        config_file_list = glob.glob(
+            os.path.join(config_dir, f"run_{self.NAME}_default*"))
+        if(len(config_file_list) == 0):
+            raise RuntimeError(
+                f"There is no default configuration file for {self.NAME}")
+        if(len(config_file_list) > 1):
+            raise RuntimeError(
+                "There is more than one default configuration file for "
+                + f"{self.NAME}")
+        config_file = config_file_list[0]
+
+        # We get the right configuration file
+        if(self.config is not None):
+            config_file = None
+            config_file_list = glob.glob(
+                os.path.join(config_dir, f"run_{self.NAME}*"))
+            for config_file_ in config_file_list:
+                if(config_file_ == os.path.join(
+                    config_dir, f"run_{self.NAME}_{self.config}")
+                   or (config_file_ == os.path.join(
+                       config_dir, f"run_{self.NAME}_default_{self.config}"))):
+                    config_file = config_file_
+                    continue
+            if(config_file is None):
+                raise RuntimeError(
+                    "There is no configuration file"
+                    + f"named {self.config} for {self.NAME}")
+        return config_file
+
+    def _wait_queue(self):
+        # We put a job in the queue only if we have not reached the maximum
+        # number of jobs in the queue we have fixed
+        if(self.queue is None):
+            return
+        with self.__queue_condition:
+            # We start the poller (if it is not started)
+            if(self.__poller is None):
+                self.__poller = threading.Thread(
+                    target=self.__poll_queue, daemon=True)
+                self.__poller.start()
+            # We wait for a free slot (and we take it)
+            while(self.__queue_size is None
+                  or self.__queue_size >= self.queue):
+                self.__queue_condition.wait()
+            self.__queue_size += 1
+
+    def __poll_queue(self):
+        # We get the number of jobs in the queue (every "sleep" seconds
+        # until the jobs are submitted)
+        while(True):
+            queue_size = self.get_job_queue_size()
+            with self.__queue_condition:
+                self.__queue_size = queue_size
+                self.__queue_condition.notify_all()
+            if(self.__poller_stop.wait(self.sleep)):
+                return
+
+    def _group(self):
+        # We group the jobs (before submitting them) if we pack them, if we
+        # put them in a queue or if we submit them at the same time
+        return (self.pack is not None or self.pilot is not None
+                or self.submit is not None)
+
+    def run(self):
+        try:
+            self.__run()
+        finally:
+            # We stop the poller (if it is started)
+            self.__poller_stop.set()
+
+    def __run(self):
+        # If we do not group the jobs, we submit the jobs directly
+        if(not(self._group())):
+            return super().run()
+
+        # Otherwise, we get the jobs of the tree (with the jobs on which they
+        # depend)
+        self._job_dict = {}
+        super().run()
+
+        # If we have pilot workers, we put the jobs in the queue
+        if(self.pilot is not None):
+            return self.__submit_pilot()
+
+        # We group the jobs that have the same dependencies; the jobs of a
+        # group do not depend on each other, and a group depends only on the
+        # groups of the jobs with smaller ids (so we submit the groups in
+        # this order)
+        group_dict = {}
+        for run_name, (_, job_list) in self._job_dict.items():
+            group_dict.setdefault(tuple(job_list), []).append(run_name)
+
+        # We split each group in units to submit (e.g., packs)
+        unit_list = []
+        for job_list, run_name_list in group_dict.items():
+            for function, run_name_list_ in self._get_unit_list(
+                    run_name_list):
+                unit_list.append((function, run_name_list_, list(job_list)))
+
+        # We submit the units one after another (or at the same time)
+        if(self.submit is None):
+            for function, run_name_list, job_list in unit_list:
+                function(run_name_list, job_list)
+        else:
+            self.__submit_unit(unit_list)
+
+    def _get_unit_list(self, run_name_list):
+        # We split the group in packs (or in jobs)
+        size = self.pack if self.pack is not None else 1
+        return [
+            (self.__submit_pack, run_name_list[i:i+size])
+            for i in range(0, len(run_name_list), size)]
+
+    def __submit_unit(self, unit_list):
+
+        # We count, for each unit, the units on which it depends, and we
+        # keep, for each unit, the units that depend on it
+        unit_dict = {}
+        for i, (_, run_name_list, _) in enumerate(unit_list):
+            for run_name in run_name_list:
+                unit_dict[run_name] = i
+        count_list = []
+        child_list = [[] for _ in unit_list]
+        ready_list = []
+        for i, (_, _, job_list) in enumerate(unit_list):
+            unit_set = {
+                unit_dict[run_name] for run_name in job_list
+                if run_name in unit_dict}
+            count_list.append(len(unit_set))
+            for j in unit_set:
+                child_list[j].append(i)
+            # The units that do not depend on other units are ready
+            if(count_list[i] == 0):
+                heapq.heappush(ready_list, i)
+
+        # We submit the units in a pool of threads: a unit is submitted as
+        # soon as the units on which it depends are submitted
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.submit) as executor:
+            future_dict = {}
+            while(len(ready_list) > 0 or len(future_dict) > 0):
+
+                # We submit the ready units
+                while(len(ready_list) > 0):
+                    i = heapq.heappop(ready_list)
+                    function, run_name_list, job_list = unit_list[i]
+                    future = executor.submit(
+                        function, run_name_list, job_list)
+                    future_dict[future] = i
+
+                # We wait for (at least) one submission to finish
+                done_set, _ = concurrent.futures.wait(
+                    future_dict,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+
+                # The units that depend only on submitted units are now
+                # ready
+                for future in done_set:
+                    i = future_dict.pop(future)
+                    future.result()
+                    for j in child_list[i]:
+                        count_list[j] -= 1
+                        if(count_list[j] == 0):
+                            heapq.heappush(ready_list, j)
+
+    def _submit_one(self, run_name, job_list):
+        # We submit one job (that we have kept)
+        job_id = self._submit(self._job_dict[run_name][0], run_name, job_list)
+        if(job_id is not None):
+            self.set_job_id(run_name, job_id)
+
+    def _get_table_file(self, kind, name):
+        # We get the file of a table of commands (next to the states of the
+        # jobs, i.e., on the shared disk)
+        table_dir = os.path.abspath(os.path.join(
+            self.state_dir if self.state_dir is not None else ".run_state",
+            kind))
+        os.makedirs(table_dir, exist_ok=True)
+        return os.path.join(table_dir, name)
+
+    def __submit_pilot(self):
+
+        # We write the jobs in the queue
+        queue_file = self._get_table_file("pilot", self.prefix_run_name[:-1])
+        JobQueue(queue_file).create([
+            [run_name, command, job_list]
+            for run_name, (command, job_list) in self._job_dict.items()])
+
+        # We submit the workers (that do not depend on other jobs)
+        for i in range(self.pilot):
+            run_name = "{}pilot_{}".format(self.prefix_run_name, i+1)
+            self._submit("python {} worker {}".format(
+                os.path.abspath(__file__), queue_file), run_name, [])
+
+    def __submit_pack(self, run_name_list, job_list):
+
+        # If there is only one job, we submit it as usual
+        if(len(run_name_list) == 1):
+            self._submit_one(run_name_list[0], job_list)
+            return
+
+        # We write the script of the pack: the commands are run in the
+        # background (with at most one command per allocated cpu), and the
+        # pack fails if a command fails
+        pack_file = self._get_table_file("pack", run_name_list[0]+".sh")
+        with open(pack_file, "w") as f:
+            f.write("N=$(nproc)\nF=$(mktemp)\n")
+            for run_name in run_name_list:
+                f.write("while [ $(jobs -rp | wc -l) -ge $N ]; do "
+                        + "wait -n; done\n")
+                f.write("( {} ) || echo 1 >> \"$F\" &\n".format(
+                    self._job_dict[run_name][0]))
+            f.write("wait\n[ ! -s \"$F\" ]; S=$?; rm -f \"$F\"; exit $S\n")
+
+        # We submit the pack, and the jobs of the pack have its id
+        job_id = self._submit(
+            "bash {}".format(pack_file), run_name_list[0], job_list)
+        if(job_id is not None):
+            for run_name in run_name_list:
+                self.set_job_id(run_name, job_id)
+
+    def _run_command(
+        self, command, run_name=None, job_list=None, resource_dict=None,
+        job_hash=None
+    ):
+
+        # The job saves its state (if we need to)
+        command = self._wrap_command(command, job_hash)
+
+        # If we group the jobs, we keep the job (and a copy of the jobs on
+        # which it depends) to submit it later
+        if(self._group()):
+            self._job_dict[run_name] = (command, list(job_list))
+            return
+
+        # Otherwise, we submit the job
+        job_id = self._submit(command, run_name, job_list)
+        if(job_id is not None):
+            self.set_job_id(run_name, job_id)
+
+    def _submit(self, command, run_name, job_list):
+        # To be implemented!
+        raise NotImplementedError
+
+
+###############################################################################
+
+class SlurmLaunchConfig(ClusterLaunchConfig):
+
+    NAME = "slurm"
+
+    # NOTE: The maximum number of tasks in a job array (see MaxArraySize in
+    # the configuration of slurm)
+    ARRAY_SIZE = 1000
+
+    def __init__(
+        self, f, job_id_list, config, queue, sleep,
+        state_dir=None, resume=False, pack=None, pilot=None, submit=None,
+        array=False, array_limit=None
+    ):
+        super().__init__(
+            f, job_id_list, config, queue, sleep,
+            state_dir=state_dir, resume=resume, pack=pack, pilot=pilot,
+            submit=submit)
+
+        # NOTE: If array is True, the jobs with the same dependencies are
+        # submitted in job arrays (with at most array_limit tasks running at
+        # the same time); each task runs the command associated with its
+        # SLURM_ARRAY_TASK_ID in a table (i.e., a bash script)
+        self.array = array
+        self.array_limit = array_limit
+        self.__array_dict = {}
+
     def get_job_queue_size(self):
         result = subprocess.run("squeue -u $(whoami)",
             shell=True, stdout=subprocess.PIPE,
@@ -468,13 +1165,65 @@ class SlurmLaunchConfig(LaunchConfig):
         job_queue_size = len(result.stdout.split("\n")[1:-1])
         return job_queue_size
 
-    def _run_command(self, command, run_name=None, job_list=None):
-
+    def _group(self):
+        # We group the jobs if we create job arrays (or if we pack them)
+        return self.array or super()._group()
+
+    def _get_unit_list(self, run_name_list):
+        # If we do not create job arrays, we split the group as usual
+        if(not(self.array)):
+            return super()._get_unit_list(run_name_list)
+
+        # Otherwise, we split the group in (one or more) job arrays
+        return [
+            (self.__submit_array, run_name_list[i:i+self.ARRAY_SIZE])
+            for i in range(0, len(run_name_list), self.ARRAY_SIZE)]
+
+    def __submit_array(self, run_name_list, job_list):
+
+        # If there is only one job, we submit it as usual
+        if(len(run_name_list) == 1):
+            self._submit_one(run_name_list[0], job_list)
+            return
+
+        # We write the table of the commands (a task runs the command
+        # associated with its SLURM_ARRAY_TASK_ID)
+        table_file = self._get_table_file("array", run_name_list[0]+".sh")
+        with open(table_file, "w") as f:
+            f.write("case \"$SLURM_ARRAY_TASK_ID\" in\n")
+            for i, run_name in enumerate(run_name_list):
+                f.write("{})\n{}\n;;\n".format(
+                    i, self._job_dict[run_name][0]))
+            f.write("esac\n")
+
+        # We submit the job array (with the limit of running tasks)
+        array = "--array=0-{}".format(len(run_name_list)-1)
+        if(self.array_limit is not None):
+            array += "%{}".format(self.array_limit)
+        job_id = self._submit(
+            "bash {}".format(table_file), run_name_list[0], job_list, array)
+
+        # We save the id of each task (i.e., <array id>_<task id>)
+        if(job_id is not None):
+            self.__array_dict[job_id] = set(run_name_list)
+            for i, run_name in enumerate(run_name_list):
+                self.set_job_id(run_name, "{}_{}".format(job_id, i))
+
+    def _submit(self, command, run_name, job_list, array=""):
+
+        # If our job depends on all the tasks of a job array, it depends on
+        # the job array (and on the other tasks otherwise)
         new_job_list = []
         if(job_list is not None):
+            job_set = set(job_list)
+            for job_id, run_name_set in list(self.__array_dict.items()):
+                if(run_name_set <= job_set):
+                    new_job_list.append(job_id)
+                    job_set -= run_name_set
             for run_name_ in job_list:
                 job_id = self.get_job_id(run_name_)
-                if(job_id is not None):
+                if(job_id is not None and run_name_ in job_set
+                   and job_id not in new_job_list):
                     new_job_list.append(job_id)
         job_list = new_job_list
 
@@ -488,76 +1237,36 @@ class SlurmLaunchConfig(LaunchConfig):
                 dependency += str(job_id)+":"
         dependency = dependency[:-1]
 
-        # We get the default configuration file
-        config_dir = os.environ.get("MLTOOLS_PATH", ".")
-        config_file_list = glob.glob(os.path.join(config_dir, "run_slurm_default*"))
-        if(len(config_file_list) == 0):
-            raise RuntimeError(
-                "There is no default configuration file for slurm")
-        if(len(config_file_list) > 1):
-            raise RuntimeError(
-                "There is more than one default configuration file for slurm")
-        config_file = config_file_list[0]
-
-        # We get the right configuration file
-        if(self.config is not None):
-            config_file = None
-            config_file_list = glob.glob(os.path.join(config_dir, "run_slurm*"))
-            for config_file_ in config_file_list:
-                if(config_file_ == os.path.join(config_dir, f"run_slurm_{self.config}")
-                   or (config_file_ == os.path.join(config_dir, f"run_slurm_default_{self.config}"))):
-                    config_file = config_file_
-                    continue
-            if(config_file is None):
-                raise RuntimeError(
-                    "There is no configuration file"
-                    + f"named {self.config} for slurm")
+        # We get the configuration file
+        config_file = self._get_config_file()
 
         # We put a job in the queue only if we have not reached the maximum
         # number of jobs in the queue we have fixed
-        if(self.queue is not None):
-            while(self.get_job_queue_size() >= self.queue):
-                time.sleep(self.sleep)
+        self._wait_queue()
 
         # We run the command to run oar
-        result = subprocess.run("sbatch {} -J {} {} '{}'".format(
-            dependency, run_name, config_file, command),
+        result = subprocess.run("sbatch {} {} -J {} {} '{}'".format(
+            dependency, array, run_name, config_file, command),
             shell=True, stdout=subprocess.PIPE,
             stderr=subprocess.PIPE, universal_newlines=True
         )
-        logging.info("Executing sbatch {} -J {} {} '{}'\n".format(
-            dependency, run_name, config_file, command)
+        logging.info("Executing sbatch {} {} -J {} {} '{}'\n".format(
+            dependency, array, run_name, config_file, command)
         )
         print(result.stdout, end="")
         print(result.stderr, end="")
 
-        # We get the job id and save it
+        # We get the job id and return it
         re_match = re.search(r'\d+', result.stdout)
         if(re_match):
-            job_id = re_match.group(0)
-            self.set_job_id(run_name, int(job_id))
+            return int(re_match.group(0))
+        return None
 
 ###############################################################################
 
-class OarLaunchConfig(LaunchConfig):
-
-    def __init__(self, f, job_id_list, config, queue, sleep):
-        super().__init__(f, job_id_list)
-        self.config = config
-        self.queue = queue
-        self.sleep = sleep
-        self.__job_id_dict = {}
+class OarLaunchConfig(ClusterLaunchConfig):
 
-    def get_job_id(self, run_name):
-        # We get the id of a job in the dict given the job name
-        try:
-            return self.__job_id_dict[run_name]
-        except KeyError:
-            return None
-
-    def set_job_id(self, run_name, job_id):
-        # We get the id of a job in the dict given the job name
-        self.__job_id_dict[run_name] = job_id
+    NAME = "oar"
 
     def get_job_queue_size(self):
         result = subprocess.run("oarstat -u $(whoami)",
@@ -567,7 +1276,7 @@ class OarLaunchConfig(LaunchConfig):
         job_queue_size = len(result.stdout.split("\n")[2:-1])
         return job_queue_size
 
-    def _run_command(self, command, run_name=None, job_list=None):
+    def _submit(self, command, run_name, job_list):
 
         # NOTE: we can depend on only one job in OAR ...
         # So we will always depend on the highest job id in the list ...
@@ -581,36 +1290,12 @@ class OarLaunchConfig(LaunchConfig):
         else:
             dependency = ""
 
-        # We get the default configuration file
-        config_dir = os.environ.get("MLTOOLS_PATH", ".")
-        config_file_list = glob.glob(os.path.join(config_dir, "run_oar_default*"))
-        if(len(config_file_list) == 0):
-            raise RuntimeError(
-                "There is no default configuration file for oar")
-        if(len(config_file_list) > 1):
-            raise RuntimeError(
-                "There is more than one default configuration file for oar")
-        config_file = config_file_list[0]
-
-        # We get the right configuration file
-        if(self.config is not None):
-            config_file = None
-            config_file_list = glob.glob(os.path.join(config_dir, "run_oar*"))
-            for config_file_ in config_file_list:
-                if(config_file_ == os.path.join(config_dir, f"run_oar_{self.config}")
-                   or (config_file_ == os.path.join(config_dir, f"run_oar_default_{self.config}"))):
-                    config_file = config_file_
-                    continue
-            if(config_file is None):
-                raise RuntimeError(
-                    "There is no configuration file"
-                    + f"named {self.config} for oar")
+        # We get the configuration file
+        config_file = self._get_config_file()
 
         # We put a job in the queue only if we have not attained the maximum
         # number of jobs in the queue we have fixed
-        if(self.queue is not None):
-            while(self.get_job_queue_size() >= self.queue):
-                time.sleep(self.sleep)
+        self._wait_queue()
 
         # We run the command to run oar
         result = subprocess.run("oarsub {} -n {} -S '{} {}'".format(
@@ -624,11 +1309,205 @@ class OarLaunchConfig(LaunchConfig):
         print(result.stdout, end="")
         print(result.stderr, end="")
 
-        # We get the job id and save it
+        # We get the job id and return it
         re_match = re.search(r'OAR_JOB_ID=(\d+)', result.stdout)
         if(re_match):
-            job_id = re_match.group(1)
-            self.set_job_id(run_name, int(job_id))
+            return int(re_match.group(1))
+        return None
+
+###############################################################################
+
+class JobQueue(Lock):
+
+    # NOTE: A worker writes that a job is alive every HEARTBEAT seconds; if a
+    # job is not alive for TIMEOUT seconds (e.g., its worker is dead), it is
+    # put in the queue again (at most RETRY times) and it fails otherwise
+    HEARTBEAT = 60
+    TIMEOUT = 600
+    RETRY = 1
+
+    def __init__(self, file_):
+        # NOTE: The jobs (i.e., their name, command and the jobs on which they
+        # depend) are in the file <file_>.json, and the file file_ (that we
+        # modify with the lock) contains the lines of the workers: "running
+        # <job name> <worker> <time>", "alive <job name> <time>", "requeue
+        # <job name>" and "done <job name> <exit status>"
+        super().__init__(file_)
+        self._job_file = self._path_file+".json"
+        self.__worker = "{}:{}".format(socket.gethostname(), os.getpid())
+
+    def create(self, job_list):
+        # We write the jobs (in a temporary file that we rename)
+        tmp_file = "{}.{}.tmp".format(self._job_file, os.getpid())
+        with open(tmp_file, "w") as f:
+            json.dump({"job_list": job_list}, f)
+        os.replace(tmp_file, self._job_file)
+        # We empty the queue
+        self.do(self.__create)
+
+    def __create(self):
+        open(self._path_file, "w").close()
+
+    def work(self, sleep=5):
+
+        # We read the jobs and we initialize the queue
+        self.__init_job()
+
+        # While there are jobs to run,
+        while(True):
+
+            # We take a job that is ready (if there is one)
+            finished, run_name = self.do(self.__take)
+            if(finished):
+                return
+            if(run_name is None):
+                time.sleep(sleep)
+                continue
+
+            # We run the job (and we write that it is alive while it runs)
+            # and we write its exit status in the queue
+            command = self.__command_dict[run_name]
+            logging.info("Job: {} - Executing {}\n".format(run_name, command))
+            stop = threading.Event()
+            heartbeat = threading.Thread(
+                target=self.__heartbeat, args=(run_name, stop), daemon=True)
+            heartbeat.start()
+            try:
+                status = subprocess.call(command, shell=True)
+            finally:
+                stop.set()
+                heartbeat.join()
+            logging.info("Job: {} - Exit status {}\n".format(run_name, status))
+            self.do(self.__write, "done {} {}\n".format(run_name, status))
+
+    def __heartbeat(self, run_name, stop):
+        # We write that the job is alive (every HEARTBEAT seconds)
+        while(not(stop.wait(self.HEARTBEAT))):
+            self.do(self.__write, "alive {} {}\n".format(
+                run_name, time.time()))
+
+    def __init_job(self):
+
+        # We read the jobs
+        with open(self._job_file, "r") as f:
+            job_list = json.load(f)["job_list"]
+
+        # We count, for each job, the jobs on which it depends, and we keep,
+        # for each job, the jobs that depend on it
+        self.__command_dict = {}
+        self.__index_dict = {}
+        self.__count_dict = {}
+        self.__child_dict = {run_name: [] for run_name, _, _ in job_list}
+        self.__ready_list = []
+        for i, (run_name, command, dependency_list) in enumerate(job_list):
+            self.__command_dict[run_name] = command
+            self.__index_dict[run_name] = i
+            dependency_list = [
+                run_name_ for run_name_ in set(dependency_list)
+                if run_name_ in self.__child_dict]
+            self.__count_dict[run_name] = len(dependency_list)
+            for run_name_ in dependency_list:
+                self.__child_dict[run_name_].append(run_name)
+            if(self.__count_dict[run_name] == 0):
+                heapq.heappush(self.__ready_list, (i, run_name))
+
+        # We keep the jobs that are started and finished, the last time
+        # where the running jobs were alive, the number of times that the
+        # jobs were started (and the part of the queue that we have read)
+        self.__started_set = set()
+        self.__done_set = set()
+        self.__alive_dict = {}
+        self.__try_dict = {}
+        self.__offset = 0
+
+    def __read(self):
+
+        # We read the new lines of the queue
+        with open(self._path_file, "r") as f:
+            f.seek(self.__offset)
+            line_list = f.read()
+            self.__offset = f.tell()
+
+        # We update the jobs that are started, alive and finished; the jobs
+        # that are put in the queue again and the jobs that depend only on
+        # finished jobs are now ready
+        for line in line_list.split("\n"):
+            line = line.split()
+            if(len(line) == 0):
+                continue
+            run_name = line[1]
+            if(run_name in self.__done_set):
+                continue
+            if(line[0] == "running"):
+                self.__started_set.add(run_name)
+                self.__alive_dict[run_name] = float(line[3])
+                self.__try_dict[run_name] = (
+                    self.__try_dict.get(run_name, 0)+1)
+            elif(line[0] == "alive" and run_name in self.__alive_dict):
+                self.__alive_dict[run_name] = float(line[2])
+            elif(line[0] == "requeue" and run_name in self.__alive_dict):
+                self.__started_set.discard(run_name)
+                del self.__alive_dict[run_name]
+                heapq.heappush(self.__ready_list, (
+                    self.__index_dict[run_name], run_name))
+            elif(line[0] == "done"):
+                self.__started_set.add(run_name)
+                self.__done_set.add(run_name)
+                self.__alive_dict.pop(run_name, None)
+                for run_name_ in self.__child_dict[run_name]:
+                    self.__count_dict[run_name_] -= 1
+                    if(self.__count_dict[run_name_] == 0):
+                        heapq.heappush(self.__ready_list, (
+                            self.__index_dict[run_name_], run_name_))
+
+    def __requeue(self):
+        # The jobs that are not alive for TIMEOUT seconds (e.g., their worker
+        # is dead) are put in the queue again (or they fail if they were
+        # started too many times)
+        line = ""
+        for run_name, alive_time in self.__alive_dict.items():
+            if(time.time()-alive_time < self.TIMEOUT):
+                continue
+            if(self.__try_dict[run_name] <= self.RETRY):
+                logging.info("Job: {} - Not alive, put in the queue\n".format(
+                    run_name))
+                line += "requeue {}\n".format(run_name)
+            else:
+                logging.info("Job: {} - Not alive, failed\n".format(
+                    run_name))
+                line += "done {} -1\n".format(run_name)
+        if(line != ""):
+            self.__write(line)
+            self.__read()
+
+    def __write(self, line):
+        # We append a line in the queue
+        with open(self._path_file, "a") as f:
+            f.write(line)
+
+    def __take(self):
+
+        # We read the new lines of the queue (and we put the jobs that are
+        # not alive in the queue again)
+        self.__read()
+        self.__requeue()
+
+        # We take the first ready job (in the order of the ids) that is not
+        # started
+        while(len(self.__ready_list) > 0):
+            _, run_name = heapq.heappop(self.__ready_list)
+            if(run_name in self.__started_set):
+                continue
+            self.__write("running {} {} {}\n".format(
+                run_name, self.__worker, time.time()))
+            self.__read()
+            return False, run_name
+
+        # Otherwise, the queue is finished if all the jobs are finished (and
+        # we need to wait for the other jobs otherwise, since a job can be
+        # put in the queue again)
+        return len(self.__done_set) == len(self.__command_dict), None
+
 
 ###############################################################################
 
@@ -644,10 +1523,11 @@ if __name__ == "__main__":
 
     arg_parser.add_argument(
         "mode", metavar="mode", type=str,
-        help="The mode of execution (either print, local, slurm, or oar)")
+        help="The mode of execution (either print, local, slurm, oar, pilot"
+        + " or worker)")
     arg_parser.add_argument(
         "path", metavar="path", type=str,
-        help="The path of the ini file")
+        help="The path of the ini file (or of the queue in worker mode)")
     arg_parser.add_argument(
         "--config", metavar="config", default=None, type=str,
         help="The configuration associated with the mode slurm or oar")
@@ -662,6 +1542,56 @@ if __name__ == "__main__":
         "--sleep", metavar="sleep", default=None, type=int,
         help="The time (sec) before rechecking the number of jobs in the queue"
     )
+    arg_parser.add_argument(
+        "-j", "--worker", metavar="worker", default=None, type=int,
+        help="The number of jobs to run at the same time (in local mode) or"
+        + " the number of workers (in pilot mode)"
+    )
+    arg_parser.add_argument(
+        "--cluster", metavar="cluster", default="slurm", type=str,
+        help="The cluster of the workers, i.e., slurm or oar (in pilot mode)"
+    )
+    arg_parser.add_argument(
+        "--cpus", metavar="cpus", default=None, type=int,
+        help="The number of cpus that the jobs can use (in local mode)"
+    )
+    arg_parser.add_argument(
+        "--mem", metavar="mem", default=None, type=str,
+        help="The memory that the jobs can use, e.g., 64G (in local mode)"
+    )
+    arg_parser.add_argument(
+        "--mem-check", action="store_true",
+        help="Check the available memory before running a job (in local mode)"
+    )
+    arg_parser.add_argument(
+        "--pin", action="store_true",
+        help="Pin each job on its own cpus (in local mode)"
+    )
+    arg_parser.add_argument(
+        "--state", metavar="state", default=None, type=str,
+        help="The directory where the state of the jobs is saved (by default,"
+        + " it is not saved, and it is .run_state with --resume)"
+    )
+    arg_parser.add_argument(
+        "--resume", action="store_true",
+        help="Skip the jobs that succeeded in a previous run (with --state)"
+    )
+    arg_parser.add_argument(
+        "--pack", metavar="pack", default=None, type=int,
+        help="The number of jobs to run in one job (slurm or oar)"
+    )
+    arg_parser.add_argument(
+        "--submit", metavar="submit", default=None, type=int,
+        help="The number of submissions at the same time (slurm or oar)"
+    )
+    arg_parser.add_argument(
+        "--array", action="store_true",
+        help="Submit the jobs with the same dependencies in job arrays (slurm)"
+    )
+    arg_parser.add_argument(
+        "--array-limit", metavar="array_limit", default=None, type=int,
+        help="The maximum number of running tasks in a job array (slurm)"
+    )
 
     arg_list = arg_parser.parse_args()
     mode = arg_list.mode
@@ -670,6 +1600,18 @@ if __name__ == "__main__":
     job = arg_list.job
     queue = arg_list.queue
     sleep = arg_list.sleep
+    worker = arg_list.worker
+    cluster = arg_list.cluster
+    cpus = arg_list.cpus
+    mem = arg_list.mem
+    mem_check = arg_list.mem_check
+    pin = arg_list.pin
+    state_dir = arg_list.state
+    resume = arg_list.resume
+    pack = arg_list.pack
+    submit = arg_list.submit
+    array = arg_list.array
+    array_limit = arg_list.array_limit
 
     # We create the list of job id to execute
     job_id_list = None
@@ -704,27 +1646,103 @@ if __name__ == "__main__":
 
     if(mode != "print" and mode != "local"
        and mode != "slurm" and mode != "oar"
+       and mode != "pilot" and mode != "worker"
        ):
-        arg_parser.error("mode: it must be either print, local, slurm or oar")
+        arg_parser.error(
+            "mode: it must be either print, local, slurm, oar, pilot"
+            + " or worker")
     if(not(os.path.exists(path))):
         arg_parser.error("path: {} does not exist".format(path))
 
-    if(config is not None and (mode == "print" or mode == "local")):
-        arg_parser.error("--config: it is only available for slurm or oar")
-    if(queue is not None and (mode == "print" or mode == "local")):
-        arg_parser.error("--queue: it is only available for slurm or oar")
-    if(sleep is not None and (mode == "print" or mode == "local")):
-        arg_parser.error("--sleep: it is only available for slurm or oar")
-    if(sleep is None and (mode != "print" and mode != "local")):
+    cluster_mode = mode == "slurm" or mode == "oar" or mode == "pilot"
+    if(config is not None and not(cluster_mode)):
+        arg_parser.error(
+            "--config: it is only available for slurm, oar or pilot")
+    if(queue is not None and not(cluster_mode)):
+        arg_parser.error(
+            "--queue: it is only available for slurm, oar or pilot")
+    if(sleep is not None and not(cluster_mode)):
+        arg_parser.error(
+            "--sleep: it is only available for slurm, oar or pilot")
+    if(sleep is None and cluster_mode):
         sleep = 60
+    if(worker is not None and mode != "local" and mode != "pilot"):
+        arg_parser.error("--worker: it is only available for local or pilot")
+    if(worker is None and mode == "pilot"):
+        arg_parser.error("--worker: it is required for pilot")
+    if(worker is not None and worker < 1):
+        arg_parser.error("--worker: it must be at least 1")
+    if(cluster != "slurm" and cluster != "oar"):
+        arg_parser.error("--cluster: it must be either slurm or oar")
+    if(cpus is not None and mode != "local"):
+        arg_parser.error("--cpus: it is only available for local")
+    if(cpus is not None and worker is None):
+        arg_parser.error("--cpus: it is only available with --worker")
+    if(cpus is not None and cpus < 1):
+        arg_parser.error("--cpus: it must be at least 1")
+    if(mem is not None and mode != "local"):
+        arg_parser.error("--mem: it is only available for local")
+    if(mem is not None and worker is None):
+        arg_parser.error("--mem: it is only available with --worker")
+    if(mem_check and mode != "local"):
+        arg_parser.error("--mem-check: it is only available for local")
+    if(mem_check and worker is None):
+        arg_parser.error("--mem-check: it is only available with --worker")
+    if(pin and mode != "local"):
+        arg_parser.error("--pin: it is only available for local")
+    if(pin and worker is None):
+        arg_parser.error("--pin: it is only available with --worker")
+    if(pin and not(hasattr(os, "sched_setaffinity"))):
+        arg_parser.error("--pin: it is only available on Linux")
+    if(pack is not None and mode != "slurm" and mode != "oar"):
+        arg_parser.error("--pack: it is only available for slurm or oar")
+    if(pack is not None and pack < 1):
+        arg_parser.error("--pack: it must be at least 1")
+    if(pack is not None and array):
+        arg_parser.error("--pack: it is not available with --array")
+    if(submit is not None and mode != "slurm" and mode != "oar"):
+        arg_parser.error("--submit: it is only available for slurm or oar")
+    if(submit is not None and submit < 1):
+        arg_parser.error("--submit: it must be at least 1")
+    if(array and mode != "slurm"):
+        arg_parser.error("--array: it is only available for slurm")
+    if(array_limit is not None and not(array)):
+        arg_parser.error("--array-limit: it is only available with --array")
+    if(resume and state_dir is None):
+        state_dir = ".run_state"
 
     # ----------------------------------------------------------------------- #
 
     if(mode == "print"):
-        PrintLaunchConfig(path, job_id_list).run()
+        PrintLaunchConfig(
+            path, job_id_list, state_dir=state_dir, resume=resume).run()
     elif(mode == "local"):
-        LocalLaunchConfig(path, job_id_list).run()
+        launch_config = LocalLaunchConfig(
+            path, job_id_list, worker, cpus=cpus, mem=mem,
+            mem_check=mem_check, pin=pin, state_dir=state_dir, resume=resume)
+        launch_config.run()
+        # We exit with an error if a job failed
+        if(any(status != 0 for status in launch_config.status_dict.values())):
+            sys.exit(1)
     elif(mode == "slurm"):
-        SlurmLaunchConfig(path, job_id_list, config, queue, sleep).run()
+        SlurmLaunchConfig(
+            path, job_id_list, config, queue, sleep,
+            state_dir=state_dir, resume=resume, pack=pack, submit=submit,
+            array=array, array_limit=array_limit).run()
     elif(mode == "oar"):
-        OarLaunchConfig(path, job_id_list, config, queue, sleep).run()
+        OarLaunchConfig(
+            path, job_id_list, config, queue, sleep,
+            state_dir=state_dir, resume=resume, pack=pack,
+            submit=submit).run()
+    elif(mode == "pilot"):
+        # We write the jobs in a queue and we submit the workers
+        if(cluster == "slurm"):
+            launch_config = SlurmLaunchConfig
+        else:
+            launch_config = OarLaunchConfig
+        launch_config(
+            path, job_id_list, config, queue, sleep,
+            state_dir=state_dir, resume=resume, pilot=worker).run()
+    elif(mode == "worker"):
+        # We run the jobs of the queue
+        JobQueue(path).work()
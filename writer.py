@@ -3,8 +3,15 @@
 # terms of the Do What The Fuck You Want To Public License, Version 2,
 # as published by Sam Hocevar. See http://www.wtfpl.net/ for more details.
 
+import os
 import io
 import re
+import copy
+import time
+import atexit
+import pickle
+import hashlib
+import collections
 import h5py
 import numpy as np
 import pandas as pd
@@ -15,9 +22,49 @@ from lock import Lock
 
 class Writer(Lock):
 
-    def _load(self):
-        # We load the data
-        self._data = h5py.File(self._lock_file, "a")
+    def __init__(
+        self, file_, buffer=False, flush_time=None, flush_size=None,
+        cache_size=None, cache_dir=None
+    ):
+        super().__init__(file_)
+
+        # NOTE: If buffer is True, the "set" are done in an in-memory hdf5
+        # file and merged in the (locked) file:
+        # - every "flush_time" seconds (checked when we call "set"),
+        # - every "flush_size" calls of "set",
+        # - when we read the data (to read our writes),
+        # - when we call "flush" or when the program exits.
+        self._buffer = None
+        if(buffer):
+            self.__buffer_io = io.BytesIO()
+            self._buffer = h5py.File(self.__buffer_io, "w")
+        self.flush_time = flush_time
+        self.flush_size = flush_size
+
+        # We keep the mode of each dataset in the buffer (to merge them)
+        self.__buffer_mode_dict = {}
+        self.__buffer_size = 0
+        self.__buffer_time = time.time()
+
+        # We merge the buffer when the program exits
+        if(self._buffer is not None):
+            atexit.register(self.flush)
+
+        # NOTE: If cache_size is not None, we keep the results of the last
+        # "cache_size" queries in memory; if cache_dir is not None, we also
+        # keep the results of the queries (without filter functions) in
+        # this directory. A result is reused while the file is not modified.
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.__cache_dict = collections.OrderedDict()
+        if(self.cache_dir is not None):
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _load(self, mode="a"):
+        # We load the data (we can only read a non-empty file)
+        if(mode == "r" and os.path.getsize(self._lock_file) == 0):
+            mode = "a"
+        self._data = h5py.File(self._lock_file, mode)
 
     def _close(self):
         # We close the data
@@ -26,45 +73,118 @@ class Writer(Lock):
     # ----------------------------------------------------------------------- #
 
     def set(self, data_dict, path_dict, mode="r"):
-        return self.do(self.__set, data_dict, path_dict, mode=mode)
+        # If we do not have a buffer, we write directly in the file
+        if(self._buffer is None):
+            return self.do(self.__set, data_dict, path_dict, mode=mode)
+
+        # We check the data before writing them in the buffer
+        self.__check(data_dict, path_dict)
+        path_name = self.__path_dict_to_path_name(path_dict)
+
+        # If a dataset is in the buffer with the mode "r", we cannot merge
+        # the data that we append: we merge the buffer first
+        for key in data_dict.keys():
+            if(mode == "a" and self.__buffer_mode_dict.get(
+                    (path_name, key)) == "r"):
+                self.flush()
+                break
+
+        # We write the data in the buffer
+        self.__write(self._buffer, data_dict, path_name, mode=mode)
+
+        # We update the mode of the datasets in the buffer:
+        # "w" erases what we had before, "a" keeps the mode of the data in
+        # the buffer, and "r" does not modify the buffer if we have data
+        for key in data_dict.keys():
+            if((path_name, key) not in self.__buffer_mode_dict
+               or mode == "w"):
+                self.__buffer_mode_dict[(path_name, key)] = mode
+
+        # We merge the buffer if necessary
+        self.__buffer_size += 1
+        if((self.flush_size is not None
+            and self.__buffer_size >= self.flush_size)
+           or (self.flush_time is not None
+               and time.time()-self.__buffer_time >= self.flush_time)):
+            self.flush()
+
+    def flush(self):
+        # If there is nothing in the buffer, we do nothing
+        if(self._buffer is None or len(self.__buffer_mode_dict) == 0):
+            self.__buffer_size = 0
+            self.__buffer_time = time.time()
+            return
+        self.do(self.__flush)
+
+        # We empty the buffer
+        self._buffer.close()
+        self.__buffer_io = io.BytesIO()
+        self._buffer = h5py.File(self.__buffer_io, "w")
+        self.__buffer_mode_dict = {}
+        self.__buffer_size = 0
+        self.__buffer_time = time.time()
+
+    def __flush(self):
+
+        # We load the data
+        self._load()
+
+        try:
+            # For each dataset in the buffer, we write it in the file with
+            # the mode of the buffer
+            for (path_name, key), mode in self.__buffer_mode_dict.items():
+                if(path_name != ""):
+                    data = self._buffer[f"{path_name}/{key}"][()]
+                else:
+                    data = self._buffer[key][()]
+                self.__write(self._data, {key: data}, path_name, mode=mode)
+        finally:
+            # We close the data
+            self._close()
 
     def __set(self, data_dict, path_dict, mode="r"):
-        # NOTE: Here is the different mode to save the data:
-        # "w" -> erase existing data
-        # "a" -> append the data to the existing one
-        # "r" -> do not erase the existing data, but write if no data
 
         # We load the data
         self._load()
 
+        try:
+            # We check the data and we write them
+            self.__check(data_dict, path_dict)
+            path_name = self.__path_dict_to_path_name(path_dict)
+            self.__write(self._data, data_dict, path_name, mode=mode)
+        finally:
+            # We close the data
+            self._close()
+
+    def __check(self, data_dict, path_dict):
+
         # We first check that the values/keys in the path_dict are of type str
         for key in path_dict.keys():
             if(not(isinstance(key, str))):
-                self._close()
                 raise ValueError("The keys in path_dict must be of type str")
             if(not(isinstance(path_dict[key], str))):
-                self._close()
                 raise ValueError("The values in path_dict must be of type str")
 
         # We check that the keys in the data_dict have the type str and
         # the values in the data_dict are compatible with a hdf5 file
         for key in data_dict.keys():
             if(not(isinstance(key, str))):
-                self._close()
                 raise ValueError("The keys in data_dict must be of type str")
             if(not(self.__ishdf5compatible(data_dict[key]))):
-                self._close()
                 raise ValueError(f"The values in data_dict must be compatible"
                                  + " with an hdf5 file")
 
-        # We create the name of the path from the path dict
-        path_name = self.__path_dict_to_path_name(path_dict)
+    def __write(self, data, data_dict, path_name, mode="r"):
+        # NOTE: Here is the different mode to save the data:
+        # "w" -> erase existing data
+        # "a" -> append the data to the existing one
+        # "r" -> do not erase the existing data, but write if no data
 
         # We create the groups in the hdf5 file if necessary
         if(path_name != ""):
-            group = self._data.require_group(path_name)
+            group = data.require_group(path_name)
         else:
-            group = self._data
+            group = data
 
         # For each key in the data dict
         for key in data_dict.keys():
@@ -85,10 +205,8 @@ class Writer(Lock):
                 # If the data do not have the same dimensions,
                 # there is a problem
                 if(len(old_shape_list) != len(shape_list)):
-                    self._close()
                     raise ValueError("Shapes differ")
                 if(old_shape_list[1:] != shape_list[1:]):
-                    self._close()
                     raise ValueError("Shapes differ beyond the 1st dimension")
 
                 # If there is no problem, we append the data
@@ -114,13 +232,9 @@ class Writer(Lock):
                         group.create_dataset(
                             key, maxshape=[None], data=[data_dict[key]])
                 else:
-                    # We raise an error and close the data
-                    self._close()
+                    # We raise an error
                     raise ValueError("mode must be either r, w, or a")
 
-        # We close the data
-        self._close()
-
     # ----------------------------------------------------------------------- #
 
     def __ishdf5compatible(self, data):
@@ -281,9 +395,12 @@ class Writer(Lock):
         self, data_list=None, path_dict=None,
         filter_data=None, filter_path=None
     ):
+        # We merge the buffer to read our writes
+        self.flush()
+
         # We get the path_dict and the data_dict
-        path_dict, data_dict = self.do(
-            self.__get, data_list=data_list, path_dict=path_dict,
+        path_dict, data_dict = self.__get_cache(
+            data_list=data_list, path_dict=path_dict,
             filter_data=filter_data, filter_path=filter_path,
             all=True)
 
@@ -313,9 +430,11 @@ class Writer(Lock):
         filter_data=None, filter_path=None,
         info=False, all=False, squeeze=True
     ):
+        # We merge the buffer to read our writes
+        self.flush()
 
-        get_dict = self.do(
-            self.__get, data_list=data_list, path_dict=path_dict,
+        get_dict = self.__get_cache(
+            data_list=data_list, path_dict=path_dict,
             filter_data=filter_data, filter_path=filter_path,
             info=info, all=all)
 
@@ -331,12 +450,83 @@ class Writer(Lock):
             return path_dict, data_dict
 
 
+    def __get_cache(
+        self, data_list=None, path_dict=None,
+        filter_data=None, filter_path=None, info=False, all=False
+    ):
+        # If we do not have a cache, we get the data
+        if(self.cache_size is None and self.cache_dir is None):
+            return self.do(
+                self.__get, data_list=data_list, path_dict=path_dict,
+                filter_data=filter_data, filter_path=filter_path,
+                info=info, all=all)
+
+        # We create the key of the query and we get the version of the file
+        key = (repr(data_list), repr(path_dict),
+               filter_data, filter_path, info, all)
+        version = self._version()
+
+        # If the result is in memory (for this version), we return it
+        if(self.cache_size is not None and key in self.__cache_dict):
+            cache_version, get_dict = self.__cache_dict[key]
+            if(cache_version == version):
+                self.__cache_dict.move_to_end(key)
+                return copy.deepcopy(get_dict)
+
+        # If the result is on the disk (for this version), we return it;
+        # we can only save the queries without filter functions
+        cache_file = None
+        if(self.cache_dir is not None
+           and filter_data is None and filter_path is None):
+            cache_name = repr(
+                (self._path_file, data_list, path_dict, info, all))
+            cache_name = hashlib.sha1(cache_name.encode()).hexdigest()
+            cache_file = os.path.join(self.cache_dir, cache_name+".pkl")
+            try:
+                with open(cache_file, "rb") as f:
+                    cache_version, get_dict = pickle.load(f)
+                if(cache_version == version):
+                    self.__set_cache(key, version, get_dict)
+                    return copy.deepcopy(get_dict)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                pass
+
+        # Otherwise, we get the data (and the version of the data we read)
+        version, get_dict = self.do(
+            self.__get_version, data_list=data_list, path_dict=path_dict,
+            filter_data=filter_data, filter_path=filter_path,
+            info=info, all=all)
+
+        # We save the result in memory and on the disk
+        self.__set_cache(key, version, get_dict)
+        if(cache_file is not None and version is not None):
+            tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+            with open(tmp_file, "wb") as f:
+                pickle.dump((version, get_dict), f)
+            os.replace(tmp_file, cache_file)
+
+        return copy.deepcopy(get_dict)
+
+    def __set_cache(self, key, version, get_dict):
+        # We save the result in memory (and we remove the oldest one)
+        if(self.cache_size is None or version is None):
+            return
+        self.__cache_dict[key] = (version, get_dict)
+        self.__cache_dict.move_to_end(key)
+        while(len(self.__cache_dict) > self.cache_size):
+            self.__cache_dict.popitem(last=False)
+
+    def __get_version(self, **kwargs):
+        # We get the data and the version of the file (while we have the lock)
+        get_dict = self.__get(**kwargs)
+        return self._version(), get_dict
+
     def __get(
         self, data_list=None, path_dict=None,
         filter_data=None, filter_path=None, info=False, all=False):
 
-        # We load the data
-        self._load()
+        # We load the data (we only read it)
+        self._load("r")
 
         # If we have a list of datasets and a path dict, this is a special case
         # and we can construct the filter
@@ -467,6 +657,9 @@ class Writer(Lock):
         self, data_list=None, path_dict=None,
         filter_data=None, filter_path=None
     ):
+        # We merge the buffer before removing the data
+        self.flush()
+
         return self.do(
             self.__filter, data_list=data_list, path_dict=path_dict,
             filter_data=filter_data, filter_path=filter_path)
@@ -570,6 +763,9 @@ class Writer(Lock):
         def filter_data(data, **kwargs):
             return True
 
+        # We merge the buffer to read our writes
+        self.flush()
+
         path_dict, data_dict = self.do(
             self.__show, filter_data=filter_data, filter_path=None)
 
@@ -582,6 +778,9 @@ class Writer(Lock):
         self, data_list=None, path_dict=None,
         filter_data=None, filter_path=None, to_print=True
     ):
+        # We merge the buffer to read our writes
+        self.flush()
+
         path_dict, data_dict = self.do(
             self.__show, data_list=data_list, path_dict=path_dict,
             filter_data=filter_data, filter_path=filter_path)
@@ -601,8 +800,8 @@ class Writer(Lock):
         filter_data=None, filter_path=None
     ):
 
-        # We load the data
-        self._load()
+        # We load the data (we only read it)
+        self._load("r")
 
         # If we have a list of datasets and a path dict, this is a special case
         # and we can construct the filter